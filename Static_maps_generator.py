@@ -1,77 +1,149 @@
 import os
 import csv
-import requests
+import argparse
 import datetime
+import http_client
 import logging
+from file_manifest import file_digest
+from geocoding import MAPS_API_BASE, normalize_key, resolve_cities
+from local_map_renderer import BASEMAP_DIR, STYLE_VERSION, render_route_maps
+from map_image_store import MapImageStore, render_key
+from map_pipeline import BRANDED_DIR, LOGO_PATH, brand_png, branding_settings, load_logo
 from keys import GOOGLE_MAPS_API_KEY
 
 # Настройка логирования
 logging.basicConfig(filename='static_map_log.txt', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
 
-# Создание директорий для PNG файлов
+# Директория для PNG файлов; с --brand карты с логотипом сразу пишутся в BRANDED_DIR
 output_dir = 'Results/html_map_png'
-os.makedirs(output_dir, exist_ok=True)
 
-# Функция для геокодирования города
-def geocode_city(city, country):
+# Параметры карты; от них же считается ключ в хранилище карт
+MAP_SIZE = '1000x1000'
+MAP_TYPE = 'roadmap'
+PATH_STYLE = 'color:0x0000ff|weight:5|geodesic:true'
+MAP_LANGUAGE = None
+
+def map_render_key(backend, dep_lat, dep_lng, dest_lat, dest_lng, basemap=None, logo=None, branding=None):
+    return render_key(
+        backend=backend, coordinates=[dep_lat, dep_lng, dest_lat, dest_lng], size=MAP_SIZE,
+        maptype=MAP_TYPE, path=PATH_STYLE, language=MAP_LANGUAGE,
+        basemap=basemap, style=STYLE_VERSION if backend == 'local' else None,
+        logo=logo, branding=branding
+    )
+
+# Скачивание карты через Google Maps Static API
+def download_static_map(departure_city, destination_city, dep_lat, dep_lng, dest_lat, dest_lng, png_filename,
+                        store, key, logo=None, branding=None):
+    # Генерация URL для Google Maps Static API
+    static_map_url = (
+        f"{MAPS_API_BASE}/maps/api/staticmap?size={MAP_SIZE}&maptype={MAP_TYPE}"
+        f"&path={PATH_STYLE}|{dep_lat},{dep_lng}|{dest_lat},{dest_lng}"
+        f"&key={GOOGLE_MAPS_API_KEY}"
+    )
+
+    # Скачивание изображения карты в хранилище и ссылка на него с датой в имени
     try:
-        response = requests.get(
-            'https://maps.googleapis.com/maps/api/geocode/json',
-            params={'address': f'{city}, {country}', 'key': GOOGLE_MAPS_API_KEY}
-        )
+        response = http_client.get(static_map_url, timeout=(5, 60), hedge=True)
         if response.status_code == 200:
-            results = response.json().get('results')
-            if results:
-                location = results[0]['geometry']['location']
-                logging.info(f'Геокодирование успешно для {city}, {country}: {location["lat"]}, {location["lng"]}')
-                return location['lat'], location['lng']
-        logging.error(f'Ошибка геокодирования для {city}, {country}: {response.status_code}')
+            # С branding обрезка и логотип делаются в памяти, без промежуточного файла
+            content = brand_png(response.content, logo, branding) if branding is not None else response.content
+            store.put_bytes(key, content)
+            store.link_to(key, png_filename)
+            logging.info(f'PNG файл создан: {png_filename}')
+            print(f'PNG файл создан: {png_filename}')  # Сообщение в терминал
+        else:
+            logging.error(f'Ошибка при скачивании карты: {response.status_code}')
+            print(f'Ошибка при скачивании карты: {response.status_code}')
     except Exception as e:
-        logging.error(f'Исключение при геокодировании для {city}, {country}: {e}')
-    return None, None
-
-# Чтение CSV-файла и генерация PNG-изображений
-with open('departures_destinations.csv', newline='', encoding='utf-8') as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        departure_city_code = row["Lead Departure City code"]
-        departure_city = row["Lead Departure City"]
-        departure_country = row["Lead Departure Country"]
-        destination_city_code = row["Lead Destination City code"]
-        destination_city = row["Lead Destination City"]
-        destination_country = row["Lead Destination Country"]
-
-        logging.info(f'Обработка пары: {departure_city} - {destination_city}')
-
-        dep_lat, dep_lng = geocode_city(departure_city, departure_country)
-        dest_lat, dest_lng = geocode_city(destination_city, destination_country)
-
-        if dep_lat and dep_lng and dest_lat and dest_lng:
-            date_str = datetime.datetime.now().strftime('%d%m')
-            png_filename = f'{output_dir}/{departure_city}_{destination_city}_map_{date_str}.png'
-
-            # Генерация URL для Google Maps Static API
-            static_map_url = (
-                f"https://maps.googleapis.com/maps/api/staticmap?size=1000x1000&maptype=roadmap"
-                f"&path=color:0x0000ff|weight:5|geodesic:true|{dep_lat},{dep_lng}|{dest_lat},{dest_lng}"
-                f"&key={GOOGLE_MAPS_API_KEY}"
-            )
-
-            # Скачивание изображения карты
-            try:
-                response = requests.get(static_map_url)
-                if response.status_code == 200:
-                    with open(png_filename, 'wb') as img_file:
-                        img_file.write(response.content)
-                    logging.info(f'PNG файл создан: {png_filename}')
-                    print(f'PNG файл создан: {png_filename}')  # Сообщение в терминал
+        logging.error(f'Исключение при скачивании карты для пары {departure_city} - {destination_city}: {e}')
+        print(f'Исключение при скачивании карты для пары {departure_city} - {destination_city}: {e}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Генерация PNG-карт маршрутов из departures_destinations.csv')
+    parser.add_argument('--backend', choices=('google', 'local'), default='google',
+                        help='google: Google Maps Static API; local: офлайн-отрисовка на подложке из --basemap')
+    parser.add_argument('--basemap', default=BASEMAP_DIR,
+                        help=f'Каталог подложки для local: tiles/{{z}}/{{x}}/{{y}}.png или world.png (по умолчанию {BASEMAP_DIR})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Число процессов для local (по умолчанию по числу ядер)')
+    parser.add_argument('--brand', action='store_true',
+                        help=f'Сразу обрезать карту и наложить логотип, как add_logos_to_maps.py, и сохранить в {BRANDED_DIR}')
+    args = parser.parse_args()
+
+    if args.brand:
+        output_dir = BRANDED_DIR
+    os.makedirs(output_dir, exist_ok=True)
+
+    store = MapImageStore()
+
+    # Логотип и настройки наложения для --brand; хэш логотипа входит в ключ хранилища
+    logo = load_logo(LOGO_PATH) if args.brand else None
+    logo_hash = file_digest(LOGO_PATH) if args.brand else None
+    branding = branding_settings() if args.brand else None
+
+    # Задания для офлайн-отрисовки: выполняются пачкой после обхода CSV
+    render_jobs = []
+    render_outputs = {}
+
+    # Чтение CSV-файла и генерация PNG-изображений
+    with open('departures_destinations.csv', newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        rows = list(reader)
+
+        # Координаты уникальных городов: офлайн-индекс по коду, хранилище, затем геокодирование
+        coordinates = resolve_cities(
+            [(row["Lead Departure City"], row["Lead Departure Country"], row["Lead Departure City code"]) for row in rows] +
+            [(row["Lead Destination City"], row["Lead Destination Country"], row["Lead Destination City code"]) for row in rows]
+        )
+
+        for row in rows:
+            departure_city_code = row["Lead Departure City code"]
+            departure_city = row["Lead Departure City"]
+            departure_country = row["Lead Departure Country"]
+            destination_city_code = row["Lead Destination City code"]
+            destination_city = row["Lead Destination City"]
+            destination_country = row["Lead Destination Country"]
+
+            logging.info(f'Обработка пары: {departure_city} - {destination_city}')
+
+            dep_lat, dep_lng = coordinates[normalize_key(departure_city, departure_country)]
+            dest_lat, dest_lng = coordinates[normalize_key(destination_city, destination_country)]
+
+            if dep_lat and dep_lng and dest_lat and dest_lng:
+                date_str = datetime.datetime.now().strftime('%d%m')
+                png_filename = f'{output_dir}/{departure_city}_{destination_city}_map_{date_str}.png'
+
+                basemap = os.path.abspath(args.basemap) if args.backend == 'local' else None
+                key = map_render_key(args.backend, dep_lat, dep_lng, dest_lat, dest_lng, basemap, logo_hash, branding)
+
+                if store.has(key):
+                    # Карта с такими же параметрами уже есть — без запросов и отрисовки
+                    store.link_to(key, png_filename)
+                    logging.info(f'PNG файл взят из хранилища: {png_filename}')
+                    print(f'PNG файл взят из хранилища: {png_filename}')
+                elif args.backend == 'local':
+                    if store.path_for(key) not in render_outputs:
+                        render_jobs.append(((dep_lat, dep_lng), (dest_lat, dest_lng), store.path_for(key)))
+                    render_outputs.setdefault(store.path_for(key), []).append((key, png_filename))
                 else:
-                    logging.error(f'Ошибка при скачивании карты: {response.status_code}')
-                    print(f'Ошибка при скачивании карты: {response.status_code}')
-            except Exception as e:
-                logging.error(f'Исключение при скачивании карты для пары {departure_city} - {destination_city}: {e}')
-                print(f'Исключение при скачивании карты для пары {departure_city} - {destination_city}: {e}')
+                    download_static_map(departure_city, destination_city, dep_lat, dep_lng, dest_lat, dest_lng,
+                                        png_filename, store, key, logo, branding)
 
-        else:
-            logging.error(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
-            print(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
+            else:
+                logging.error(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
+                print(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
+
+    # Офлайн-отрисовка на всех ядрах прямо в хранилище, затем ссылки с датой в имени
+    logo_bytes = None
+    if args.brand and os.path.exists(LOGO_PATH):
+        with open(LOGO_PATH, 'rb') as logo_file:
+            logo_bytes = logo_file.read()
+    for stored_path, error in render_route_maps(render_jobs, args.basemap, args.workers, logo_bytes, branding):
+        for key, png_filename in render_outputs[stored_path]:
+            if error is None:
+                store.link_to(key, png_filename)
+                logging.info(f'PNG файл создан: {png_filename}')
+                print(f'PNG файл создан: {png_filename}')
+            else:
+                logging.error(f'Ошибка при отрисовке карты {png_filename}: {error}')
+                print(f'Ошибка при отрисовке карты {png_filename}: {error}')
@@ -1,41 +1,87 @@
 import os
-from PIL import Image
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from file_manifest import file_digest, load_manifest, save_manifest, source_digest
+from map_pipeline import BRANDED_DIR, LOGO_PATH, brand_file, branding_settings, logo_from_bytes
 
 # Директория с исходными изображениями карт
 input_dir = 'Results/html_map_png'
 
 # Директория для сохранения изображений с логотипом
-output_dir = 'Results/static_map_png_with_logo'  # Добавили "Results/" в начало пути
-os.makedirs(output_dir, exist_ok=True)
+output_dir = BRANDED_DIR
 
-# Путь к логотипу
-logo_path = 'logo.png'
+# Путь к логотипу; отступы и обрезка заданы в map_pipeline.py
+logo_path = LOGO_PATH
 
-# Настройка отступов для логотипа (в пикселях)
-logo_lift_height = 30  # Отступ по высоте
-logo_left_offset = 30  # Отступ от левого края
+# Манифест обработанных карт: хэш исходника, хэш логотипа и настройки наложения.
+# Карта пропускается, если ни одно из них не изменилось и файл с логотипом на месте.
+MANIFEST_NAME = '.logo_manifest.json'
 
-# Высота, которую нужно обрезать снизу (в пикселях)
-crop_height = 25
+# Логотип загружается один раз в каждом рабочем процессе
+_worker_logo = None
 
-# Загрузка логотипа
-logo = Image.open(logo_path).convert("RGBA")
+def _init_worker(logo_bytes):
+    global _worker_logo
+    _worker_logo = logo_from_bytes(logo_bytes)
 
-# Проход по всем изображениям в input_dir
-for filename in os.listdir(input_dir):
-    if filename.endswith(".png"):
-        map_path = os.path.join(input_dir, filename)
-        map_image = Image.open(map_path).convert("RGBA")
+def add_logo(job):
+    map_path, output_path = job
+    try:
+        brand_file(map_path, output_path, _worker_logo)
+        return None
+    except Exception as e:
+        return str(e)
 
-        # Обрезка нижней части изображения
-        map_image = map_image.crop((0, 0, map_image.width, map_image.height - crop_height))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Наложение логотипа на карты из Results/html_map_png')
+    parser.add_argument('--workers', type=int, default=None, help='Число процессов (по умолчанию по числу ядер)')
+    parser.add_argument('--force', action='store_true', help='Обработать все карты, не глядя на манифест')
+    args = parser.parse_args()
 
-        # Добавление логотипа с отступами
-        position = (logo_left_offset, map_image.height - logo.height - logo_lift_height)
-        map_image.paste(logo, position, logo)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {} if args.force else load_manifest(manifest_path)
 
-        # Сохранение изображения с логотипом в output_dir
-        output_path = os.path.join(output_dir, filename)
-        map_image.save(output_path)
+    # Загрузка логотипа: байты передаются рабочим процессам один раз, при их запуске
+    with open(logo_path, 'rb') as logo_file:
+        logo_bytes = logo_file.read()
+    logo_hash = file_digest(logo_path)
+    settings = branding_settings()
 
-        print(f'Логотип добавлен на карту: {output_path}')
+    # Отбор карт, которые изменились с прошлого запуска
+    jobs = []
+    entries = {}
+    skipped = 0
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.endswith(".png"):
+            map_path = os.path.join(input_dir, filename)
+            output_path = os.path.join(output_dir, filename)
+            previous = manifest.get(filename)
+            source_hash, stat = source_digest(map_path, previous)
+            entry = {'source': source_hash, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                     'logo': logo_hash, 'settings': settings}
+            if previous and all(previous.get(field) == entry[field] for field in ('source', 'logo', 'settings')) \
+                    and os.path.exists(output_path):
+                # Обновить размер и время изменения, чтобы в следующий раз не пересчитывать хэш
+                manifest[filename] = entry
+                skipped += 1
+                continue
+            jobs.append((map_path, output_path))
+            entries[output_path] = (filename, entry)
+
+    # Манифест сохраняется и при прерывании, чтобы уже готовые карты не обрабатывались повторно
+    try:
+        if jobs:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(logo_bytes,)) as executor:
+                for (map_path, output_path), error in zip(jobs, executor.map(add_logo, jobs, chunksize=8)):
+                    filename, entry = entries[output_path]
+                    if error is None:
+                        manifest[filename] = entry
+                        print(f'Логотип добавлен на карту: {output_path}')
+                    else:
+                        manifest.pop(filename, None)
+                        print(f'Ошибка при добавлении логотипа на карту {map_path}: {error}')
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    print(f'Обработано карт: {len(jobs)}, пропущено без изменений: {skipped}')
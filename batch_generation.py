@@ -0,0 +1,163 @@
+import json
+import os
+import time
+import requests
+import http_client
+from openai_api import answer_from_body, api_url, auth_headers, cached_prompt_tokens, get_cache
+from response_cache import request_key
+from run_metrics import record_request, request_context
+
+# Limits of a single batch job on the OpenAI Batch API
+MAX_BATCH_REQUESTS = 50000
+COMPLETION_WINDOW = "24h"
+DEFAULT_POLL_INTERVAL = 60
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def render_batch_requests(routes, build_prompts, build_request):
+    """Collect the chat completion payloads of every route section, keyed by their content address.
+
+    Identical payloads are only submitted once, and payloads already in the response
+    cache are answered without being submitted at all.
+    """
+    cache = get_cache()
+    payloads, answers = {}, {}
+    for route in routes:
+        for prompt in build_prompts(route[1], route[4]):
+            payload = build_request(prompt)
+            key = request_key(payload)
+            if key in payloads or key in answers:
+                continue
+            cached = cache.get(key)
+            if cached is not None:
+                answers[key] = cached
+            else:
+                payloads[key] = payload
+    return payloads, answers
+
+def write_request_files(payloads, file_stem):
+    """Write the payloads as Batch API JSON Lines files, split at MAX_BATCH_REQUESTS lines."""
+    items = list(payloads.items())
+    paths = []
+    for start in range(0, len(items), MAX_BATCH_REQUESTS):
+        path = f"{file_stem}_{len(paths) + 1}.jsonl"
+        with open(path, 'w', encoding='utf-8') as request_file:
+            for key, payload in items[start:start + MAX_BATCH_REQUESTS]:
+                request_file.write(json.dumps({
+                    "custom_id": key,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": payload
+                }, ensure_ascii=False) + "\n")
+        paths.append(path)
+    return paths
+
+def submit_batch(request_path):
+    """Upload a request file and start a batch job for it; return the batch id."""
+    # Read the file up front so a retried upload sends the whole content again
+    with open(request_path, 'rb') as request_file:
+        content = request_file.read()
+    response = http_client.post(
+        api_url("/files"), headers=auth_headers(),
+        data={"purpose": "batch"}, files={"file": (os.path.basename(request_path), content)}
+    )
+    response.raise_for_status()
+    file_id = response.json()["id"]
+    response = http_client.post(api_url("/batches"), headers=auth_headers(), json={
+        "input_file_id": file_id,
+        "endpoint": "/v1/chat/completions",
+        "completion_window": COMPLETION_WINDOW
+    })
+    response.raise_for_status()
+    batch_id = response.json()["id"]
+    print(f"Submitted {request_path} as batch {batch_id}")
+    return batch_id
+
+def wait_for_batch(batch_id, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Poll a batch job until it reaches a final status and return the batch object."""
+    while True:
+        response = http_client.get(api_url(f"/batches/{batch_id}"), headers=auth_headers())
+        response.raise_for_status()
+        batch = response.json()
+        counts = batch.get("request_counts") or {}
+        print(f"Batch {batch_id}: {batch['status']} "
+              f"({counts.get('completed', 0)}/{counts.get('total', '?')} completed, {counts.get('failed', 0)} failed)")
+        if batch["status"] in FINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+def download_results(batch, results_path, payloads=None):
+    """Save the output file of a finished batch and return {custom_id: answer} for successful requests.
+
+    `payloads` (custom_id -> request body) name the model of results that do not report one.
+    """
+    payloads = payloads or {}
+    answers = {}
+    for file_field in ("output_file_id", "error_file_id"):
+        file_id = batch.get(file_field)
+        if not file_id:
+            continue
+        response = http_client.get(api_url(f"/files/{file_id}/content"), headers=auth_headers(),
+                                   timeout=(10, 600))
+        response.raise_for_status()
+        with open(results_path, 'a', encoding='utf-8') as results_file:
+            results_file.write(response.text if response.text.endswith("\n") else response.text + "\n")
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            result_response = result.get("response") or {}
+            body = result_response.get("body") or {}
+            usage = body.get("usage") or {}
+            with request_context(section="batch"):
+                record_request(model=body.get("model") or payloads.get(result.get("custom_id"), {}).get("model"),
+                               status=result_response.get("status_code"), batch=True,
+                               prompt_tokens=usage.get("prompt_tokens", 0),
+                               cached_prompt_tokens=cached_prompt_tokens(usage),
+                               completion_tokens=usage.get("completion_tokens", 0),
+                               error=None if result_response.get("status_code") == 200 else str(result.get("error")))
+            if result_response.get("status_code") == 200:
+                answers[result["custom_id"]] = answer_from_body(result_response["body"])
+            else:
+                print(f"Batch request {result.get('custom_id')} failed: {result.get('error') or result_response}")
+    return answers
+
+def run_batch(routes, build_prompts, build_request, file_stem, resume=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Generate every route section through the Batch API and return a prompt -> answer function.
+
+    Submitted batch ids are recorded in <file_stem>_state.json, so with `resume`
+    an interrupted run picks up its batches instead of submitting them again.
+    The function raises requests.HTTPError for a section the batches did not answer.
+    """
+    payloads, answers = render_batch_requests(routes, build_prompts, build_request)
+    print(f"{len(answers)} section answers found in the cache, {len(payloads)} to generate in batch mode")
+    state_path = f"{file_stem}_state.json"
+    if resume and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as state_file:
+            batch_ids = json.load(state_file)["batch_ids"]
+        print(f"Resuming batches {', '.join(batch_ids)}")
+    else:
+        batch_ids = [submit_batch(path) for path in write_request_files(payloads, f"{file_stem}_requests")] if payloads else []
+        with open(state_path, 'w', encoding='utf-8') as state_file:
+            json.dump({"batch_ids": batch_ids}, state_file)
+
+    results_path = f"{file_stem}_results.jsonl"
+    if os.path.exists(results_path):
+        os.remove(results_path)
+    cache = get_cache()
+    for batch_id in batch_ids:
+        batch = wait_for_batch(batch_id, poll_interval)
+        results = download_results(batch, results_path, payloads)
+        for key, answer in results.items():
+            if key in payloads:
+                cache.put(key, answer, model=payloads[key]["model"])
+        answers.update(results)
+    os.remove(state_path)
+
+    def lookup(prompt):
+        # Like chat_completion, a failed or expired request raises, so its route is left out
+        # of the workbook and the journal and --resume generates it again
+        answer = answers.get(request_key(build_request(prompt)))
+        if answer is None:
+            raise requests.HTTPError("Batch API returned no answer for this section")
+        return answer
+    return lookup
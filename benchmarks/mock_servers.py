@@ -0,0 +1,317 @@
+"""Local stand-ins for the OpenAI chat completions API and the Google Maps geocode and static map APIs.
+
+Every endpoint answers with canned payloads after a latency drawn from a configurable
+distribution, and can be told to fail a share of requests with 429 or 5xx responses,
+so the scripts can be benchmarked without paying for real API calls. With --rpm/--tpm
+the chat endpoint enforces per-minute request and token limits like OpenAI does and
+reports them in x-ratelimit-* headers. Its usage reports cached_tokens the way OpenAI's
+prompt caching would, so prompt layouts can be compared.
+
+    python benchmarks/mock_servers.py --port 8800 --latency-ms 300 --latency-dist lognormal --rate-429 0.02
+
+Point the scripts at it with OPENAI_API_BASE=http://127.0.0.1:8800/v1 and
+GOOGLE_MAPS_API_BASE=http://127.0.0.1:8800.
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from PIL import Image, ImageDraw
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+# Like OpenAI, prompts reuse cached prefixes from 1024 tokens on, in steps of 128 tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+
+# Canned section text; long enough to look like a real answer to the parsers
+CANNED_PARAGRAPH = (
+    "Planning a trip takes a little time, but it pays off. Compare flight times, check the weather and book "
+    "early to get the best fares. Local customs, transport and food are all part of the experience, so read "
+    "up before you go and keep some cash for small purchases."
+)
+CANNED_FAQ = "\n\n".join(
+    f"Question {number}: What should I know before the trip?\nAnswer {number}: {CANNED_PARAGRAPH}"
+    for number in range(1, 11)
+)
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0
+    latency_dist: str = "fixed"
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 0
+    rpm: int = 0
+    tpm: int = 0
+
+    def latency(self, rng):
+        """Seconds to wait before answering a request."""
+        mean = self.latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        if self.latency_dist == "uniform":
+            return rng.uniform(0, 2 * mean)
+        if self.latency_dist == "exponential":
+            return rng.expovariate(1 / mean)
+        if self.latency_dist == "lognormal":
+            # Heavy tail with the given mean: sigma 0.8, mu chosen so that E[X] = mean
+            sigma = 0.8
+            return rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return mean
+
+def _estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+class _Quota:
+    """Per-minute limit refilled continuously, as the chat endpoint enforces it; 0 means unlimited."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.level = float(limit)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def reset_seconds(self):
+        return (self.limit - self.level) * 60 / self.limit
+
+    def headers(self, kind):
+        return {
+            f"x-ratelimit-limit-{kind}": str(self.limit),
+            f"x-ratelimit-remaining-{kind}": str(max(0, int(self.level))),
+            f"x-ratelimit-reset-{kind}": f"{self.reset_seconds():.3f}s",
+        }
+
+class _PromptCache:
+    """Prompt prefixes seen so far, to report how many prompt tokens a request could read from cache."""
+
+    def __init__(self):
+        self.prefixes = set()
+        self.lock = threading.Lock()
+
+    def cached_tokens(self, payload):
+        text = "".join(f"{message['role']}: {message['content']}\n" for message in payload["messages"])
+        cached = 0
+        with self.lock:
+            for tokens in range(PROMPT_CACHE_MIN_TOKENS, _estimate_tokens(text) + 1, PROMPT_CACHE_STEP_TOKENS):
+                digest = hashlib.sha256(text[:tokens * 4].encode("utf-8")).digest()
+                if digest in self.prefixes:
+                    cached = tokens
+                else:
+                    self.prefixes.add(digest)
+        return cached
+
+def _canned_answer(payload, cached_tokens=0):
+    """Chat completion body for a request; JSON mode requests get an object with every asked section."""
+    prompt = payload["messages"][-1]["content"]
+    if (payload.get("response_format") or {}).get("type") == "json_object":
+        match = re.search(r"exactly these keys: (.*?)\. ", prompt)
+        keys = match.group(1).split(", ") if match else ["section_1"]
+        content = json.dumps({key: CANNED_FAQ if key == "section_1" else CANNED_PARAGRAPH for key in keys})
+    elif "FAQ" in prompt:
+        content = CANNED_FAQ
+    else:
+        content = CANNED_PARAGRAPH
+    prompt_tokens = sum(_estimate_tokens(message["content"]) for message in payload["messages"])
+    completion_tokens = _estimate_tokens(content)
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "model": payload.get("model", "gpt-3.5-turbo"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+def _geocode_answer(address):
+    """Deterministic coordinates for an address, spread over the inhabited latitudes."""
+    digest = hashlib.sha256(address.encode("utf-8")).digest()
+    lat = int.from_bytes(digest[:4], "big") / 2 ** 32 * 120 - 55
+    lng = int.from_bytes(digest[4:8], "big") / 2 ** 32 * 360 - 180
+    return {"status": "OK", "results": [{"geometry": {"location": {"lat": round(lat, 6), "lng": round(lng, 6)}}}]}
+
+def _canned_map(size=1000):
+    image = Image.new("RGB", (size, size), (170, 211, 223))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((size // 5, size // 4, size * 3 // 4, size * 2 // 3), fill=(236, 229, 214))
+    draw.line((size // 4, size * 2 // 3, size * 3 // 4, size // 3), fill=(0, 0, 255), width=5)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_fail(self):
+        """Sleep for the configured latency; return True when an error response was sent instead."""
+        server = self.server
+        with server.rng_lock:
+            delay = server.config.latency(server.rng)
+            roll = server.rng.random()
+        time.sleep(delay)
+        server.count(self.path)
+        if roll < server.config.rate_429:
+            self._send(429, {"error": {"message": "Rate limit reached (mock)"}},
+                       headers={"Retry-After": str(server.config.retry_after)})
+            return True
+        if roll < server.config.rate_429 + server.config.rate_5xx:
+            self._send(503, {"error": {"message": "Service unavailable (mock)"}})
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if not urlparse(self.path).path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+            return
+        payload = json.loads(body)
+        allowed, quota_headers = self.server.take_quota(payload)
+        if not allowed:
+            self.server.count(self.path + "#429")
+            self._send(429, {"error": {"message": "Rate limit reached (mock quota)"}}, headers=quota_headers)
+            return
+        if self._delay_or_fail():
+            return
+        self._send(200, _canned_answer(payload, self.server.prompt_cache.cached_tokens(payload)),
+                   headers=quota_headers)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/geocode/json"):
+            if self._delay_or_fail():
+                return
+            address = parse_qs(url.query).get("address", [""])[0]
+            self._send(200, _geocode_answer(address))
+        elif url.path.endswith("/staticmap"):
+            if self._delay_or_fail():
+                return
+            self._send(200, self.server.map_png, content_type="image/png")
+        elif url.path == "/stats":
+            self._send(200, self.server.stats())
+        else:
+            self._send(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded mock server; request counts per endpoint are available at /stats."""
+
+    daemon_threads = True
+    # Benchmarks open many keep-alive connections at once
+    request_queue_size = 256
+
+    def __init__(self, address=("127.0.0.1", 0), config=None):
+        super().__init__(address, MockHandler)
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.map_png = _canned_map()
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+        self._quotas = {kind: _Quota(limit) for kind, limit in
+                        (("requests", self.config.rpm), ("tokens", self.config.tpm)) if limit}
+        self._quota_lock = threading.Lock()
+        self.prompt_cache = _PromptCache()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path):
+        endpoint = urlparse(path).path
+        with self._counts_lock:
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def take_quota(self, payload):
+        """Charge a chat request to the per-minute limits: (allowed, rate-limit headers)."""
+        if not self._quotas:
+            return True, {}
+        # Like OpenAI, the prompt and max_tokens count against the token limit when the request arrives
+        cost = {"requests": 1,
+                "tokens": sum(_estimate_tokens(message["content"]) for message in payload["messages"])
+                + (payload.get("max_tokens") or 0)}
+        with self._quota_lock:
+            for quota in self._quotas.values():
+                quota.refill()
+            allowed = all(quota.level >= min(cost[kind], quota.limit) for kind, quota in self._quotas.items())
+            if allowed:
+                for kind, quota in self._quotas.items():
+                    quota.level -= cost[kind]
+            headers = {}
+            for kind, quota in self._quotas.items():
+                headers.update(quota.headers(kind))
+            if not allowed:
+                waits = [(min(cost[kind], quota.limit) - quota.level) * 60 / quota.limit
+                         for kind, quota in self._quotas.items()]
+                headers["Retry-After"] = f"{max(0.0, max(waits)):.3f}"
+            return allowed, headers
+
+    def stats(self):
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def start(self):
+        """Serve from a background thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean response latency in milliseconds")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed",
+                        help="Latency distribution around the mean (default: fixed)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency and error draws")
+    parser.add_argument("--rpm", type=int, default=0, help="Chat requests per minute before 429s (default: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Chat tokens per minute before 429s (default: unlimited)")
+    return parser
+
+def config_from_args(args):
+    return MockConfig(latency_ms=args.latency_ms, latency_dist=args.latency_dist, rate_429=args.rate_429,
+                      rate_5xx=args.rate_5xx, retry_after=args.retry_after, seed=args.seed, rpm=args.rpm,
+                      tpm=args.tpm)
+
+if __name__ == "__main__":
+    parser = add_mock_arguments(argparse.ArgumentParser(description="Mock OpenAI and Google Maps servers."))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    args = parser.parse_args()
+    server = MockServer((args.host, args.port), config_from_args(args))
+    print(f"Mock server listening on {server.base_url} "
+          f"(OPENAI_API_BASE={server.base_url}/v1, GOOGLE_MAPS_API_BASE={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
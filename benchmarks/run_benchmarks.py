@@ -0,0 +1,181 @@
+"""Benchmark the content generator, map generators, logo compositor and JSON parsers offline.
+
+For every route count a synthetic city pairs CSV is written to a scratch directory,
+a mock server (see mock_servers.py) stands in for OpenAI and Google Maps, and each
+script runs as its own process. Wall time, routes per second and peak RSS of every
+script are printed and saved as JSON, so runs before and after a change can be compared.
+
+    python benchmarks/run_benchmarks.py --routes 10 1000 --latency-ms 200 --rate-429 0.01
+
+Peak RSS comes from os.wait4 and is only available on Unix.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from PIL import Image
+from mock_servers import MockServer, add_mock_arguments, config_from_args
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+ROUTE_COLUMNS = [
+    "Lead Departure City code", "Lead Departure City", "Lead Departure Country",
+    "Lead Destination City code", "Lead Destination City", "Lead Destination Country"
+]
+
+# Scenario name -> command line (relative to the repository) and its inputs. Scenarios
+# run in this order, so the compositor and the parsers see what the generators produced.
+SCENARIOS = {
+    "content": lambda ctx: ["SEO_Content_generator.py", "--input", ctx["csv"], "--cache", "off",
+                            "--concurrency", str(ctx["concurrency"])],
+    "content_packed": lambda ctx: ["SEO_Content_generator.py", "--input", ctx["csv"], "--cache", "off",
+                                   "--concurrency", str(ctx["concurrency"]), "--pack"],
+    "content_spanish": lambda ctx: ["Spanish_SEO_Content_generator.py", "--input", ctx["csv"], "--cache", "off",
+                                    "--concurrency", str(ctx["concurrency"])],
+    "static_maps": lambda ctx: ["Static_maps_generator.py"],
+    "static_maps_local": lambda ctx: ["Static_maps_generator.py", "--backend", "local",
+                                      "--basemap", os.path.join(ctx["workdir"], "basemap")],
+    "logos": lambda ctx: ["add_logos_to_maps.py"],
+    "json_parser": lambda ctx: ["bilingual_parser_to_JSON.py", "--source", ctx["promos"],
+                                "--output", os.path.join(ctx["workdir"], "JSON-output")],
+    "excel_parser": lambda ctx: ["Excel_to_json_parser.py", "--source", ctx["promos"],
+                                 "--output", os.path.join(ctx["workdir"], "JSON-output-excel")],
+}
+DEFAULT_SCENARIOS = ["content", "static_maps", "logos", "json_parser", "excel_parser"]
+
+def load_city_codes():
+    with open(os.path.join(REPO_DIR, "city_codes.csv"), newline="", encoding="utf-8") as source:
+        return [(row["code"], row["city"], row["country"]) for row in csv.DictReader(source)]
+
+def write_synthetic_csv(path, routes, unknown_share=0.2, seed=0):
+    """City pairs CSV with `routes` rows; a share of the cities is unknown to the code index and gets geocoded."""
+    rng = random.Random(seed)
+    cities = load_city_codes()
+    # A few hubs depart most routes, as in the real lists
+    hubs = rng.sample(cities, min(10, len(cities)))
+
+    def city(index):
+        if rng.random() < unknown_share:
+            number = rng.randrange(max(10, routes // 5))
+            return "", f"Synthetic City {number}", "Testland"
+        return cities[index % len(cities)]
+
+    with open(path, "w", newline="", encoding="utf-8") as target:
+        writer = csv.writer(target)
+        writer.writerow(ROUTE_COLUMNS)
+        for index in range(routes):
+            departure = rng.choice(hubs) if rng.random() < 0.7 else city(rng.randrange(len(cities)))
+            destination = city(rng.randrange(len(cities)))
+            writer.writerow(list(departure) + list(destination))
+
+def prepare_workdir(workdir, routes, seed):
+    os.makedirs(workdir, exist_ok=True)
+    write_synthetic_csv(os.path.join(workdir, "departures_destinations.csv"), routes, seed=seed)
+    # Dummy keys: every request goes to the mock server
+    with open(os.path.join(workdir, "keys.py"), "w", encoding="utf-8") as keys_file:
+        keys_file.write('API_KEY = "mock-openai-key"\nGOOGLE_MAPS_API_KEY = "mock-maps-key"\n')
+    Image.new("RGBA", (180, 60), (255, 120, 0, 230)).save(os.path.join(workdir, "logo.png"))
+    os.makedirs(os.path.join(workdir, "Promos"), exist_ok=True)
+
+def run_scenario(name, ctx, server, timeout):
+    """Run one script to completion and measure it; its output is kept in <workdir>/<name>.log."""
+    command = [sys.executable, os.path.join(REPO_DIR, SCENARIOS[name](ctx)[0])] + SCENARIOS[name](ctx)[1:]
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_BASE": f"{server.base_url}/v1",
+        "GOOGLE_MAPS_API_BASE": server.base_url,
+        # keys.py of the scratch directory comes first
+        "PYTHONPATH": os.pathsep.join([ctx["workdir"], REPO_DIR, env.get("PYTHONPATH", "")]).rstrip(os.pathsep),
+        "PYTHONUNBUFFERED": "1",
+    })
+    requests_before = server.stats()
+    log_path = os.path.join(ctx["workdir"], f"{name}.log")
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        process = subprocess.Popen(command, cwd=ctx["workdir"], env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        deadline = started + timeout if timeout else None
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if deadline and time.perf_counter() > deadline:
+                process.kill()
+                pid, status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(0.05)
+    wall = time.perf_counter() - started
+    requests_after = server.stats()
+    return {
+        "scenario": name,
+        "routes": ctx["routes"],
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "wall_time_s": round(wall, 3),
+        "routes_per_s": round(ctx["routes"] / wall, 2) if wall else None,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "mock_requests": {
+            endpoint: count - requests_before.get(endpoint, 0)
+            for endpoint, count in requests_after.items() if count != requests_before.get(endpoint, 0)
+        },
+        "log": log_path,
+    }
+
+def print_table(results):
+    print(f"{'scenario':<18} {'routes':>7} {'exit':>4} {'wall s':>9} {'routes/s':>10} {'peak RSS MB':>12}")
+    for result in results:
+        print(f"{result['scenario']:<18} {result['routes']:>7} {result['exit_code']:>4} {result['wall_time_s']:>9.2f} "
+              f"{result['routes_per_s'] or 0:>10.2f} {result['peak_rss_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    parser = add_mock_arguments(argparse.ArgumentParser(description="Benchmark the scripts against mock APIs."))
+    parser.add_argument("--routes", type=int, nargs="+", default=[10, 1000],
+                        help="Route counts of the synthetic CSVs (default: 10 1000; up to 100000)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=DEFAULT_SCENARIOS,
+                        help=f"Scripts to run, in this order (default: {' '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument("--concurrency", type=int, default=8, help="--concurrency of the content generators")
+    parser.add_argument("--timeout", type=float, default=0, help="Kill a script after this many seconds (0: never)")
+    parser.add_argument("--output", default=None,
+                        help="JSON report path (default: benchmarks/results/benchmark_<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories with outputs and logs")
+    args = parser.parse_args()
+
+    server = MockServer(config=config_from_args(args)).start()
+    print(f"Mock server at {server.base_url}")
+    results = []
+    try:
+        for routes in args.routes:
+            workdir = tempfile.mkdtemp(prefix=f"seo-bog-bench-{routes}-")
+            prepare_workdir(workdir, routes, args.seed)
+            ctx = {"workdir": workdir, "csv": os.path.join(workdir, "departures_destinations.csv"),
+                   "promos": os.path.join(workdir, "Promos"), "routes": routes, "concurrency": args.concurrency}
+            # Scenarios keep the order of SCENARIOS so later ones find the outputs of earlier ones
+            for name in [name for name in SCENARIOS if name in args.scenarios]:
+                result = run_scenario(name, ctx, server, args.timeout)
+                results.append(result)
+                print(f"{name} ({routes} routes): {result['wall_time_s']:.2f} s, {result['routes_per_s']} routes/s, "
+                      f"peak RSS {result['peak_rss_mb']} MB, exit code {result['exit_code']}")
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+    print()
+    print_table(results)
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as report_file:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "mock": vars(config_from_args(args)),
+            "results": results,
+        }, report_file, indent=2)
+    print(f"Report saved as: {output}")
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Страница, которую каждый браузер пула загружает один раз; маршруты подставляются
+# через window.showRoute, а window.mapReady становится true, когда карта дорисована.
+POOL_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="{language}">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        .map-container {{
+            width: {width}px;
+            height: {height}px;
+            margin-bottom: 20px;
+        }}
+        body, html {{
+            margin: 0;
+            padding: 0;
+            height: 100%;
+            overflow: hidden;
+        }}
+    </style>
+    <script src="https://maps.googleapis.com/maps/api/js?key={api_key}&language={language}"></script>
+</head>
+<body>
+    <div id="map" class="map-container"></div>
+    <script>
+        var map, flightPath, routeGeneration = 0;
+        window.mapLoaded = false;
+        window.mapReady = false;
+
+        function initMap() {{
+            map = new google.maps.Map(document.getElementById('map'), {{
+                mapTypeId: 'roadmap',
+                disableDefaultUI: true,
+                center: {{ lat: 0, lng: 0 }},
+                zoom: 2
+            }});
+            google.maps.event.addListenerOnce(map, 'idle', function() {{ window.mapLoaded = true; }});
+        }}
+
+        window.showRoute = function(depLat, depLng, destLat, destLng) {{
+            var generation = ++routeGeneration;
+            window.mapReady = false;
+            var ready = function() {{
+                // Два кадра после загрузки тайлов, чтобы линия и тайлы успели отрисоваться
+                if (generation !== routeGeneration || window.mapReady) return;
+                requestAnimationFrame(function() {{
+                    requestAnimationFrame(function() {{
+                        if (generation === routeGeneration) window.mapReady = true;
+                    }});
+                }});
+            }};
+            google.maps.event.addListenerOnce(map, 'tilesloaded', ready);
+            google.maps.event.addListenerOnce(map, 'idle', function() {{ setTimeout(ready, 1000); }});
+            // Если область карты не изменилась, событий не будет
+            setTimeout(ready, 3000);
+
+            if (flightPath) flightPath.setMap(null);
+            var depLatLng = new google.maps.LatLng(depLat, depLng);
+            var destLatLng = new google.maps.LatLng(destLat, destLng);
+            var bounds = new google.maps.LatLngBounds();
+            bounds.extend(depLatLng);
+            bounds.extend(destLatLng);
+            flightPath = new google.maps.Polyline({{
+                path: [depLatLng, destLatLng],
+                geodesic: true,
+                strokeColor: '#0000FF',
+                strokeOpacity: 1.0,
+                strokeWeight: 2
+            }});
+            flightPath.setMap(map);
+            map.fitBounds(bounds);
+        }};
+        document.addEventListener('DOMContentLoaded', initMap);
+    </script>
+</body>
+</html>
+'''
+
+# Сколько раз пробовать запустить браузер взамен упавшего, прежде чем уменьшить пул
+RESTART_ATTEMPTS = 2
+
+def write_pool_page(path, api_key, language='es', width=1000, height=1000):
+    with open(path, 'w', encoding='utf-8') as page_file:
+        page_file.write(POOL_PAGE_TEMPLATE.format(api_key=api_key, language=language, width=width, height=height))
+    return path
+
+class BrowserPool:
+    """Пул долгоживущих headless-браузеров Chrome с уже загруженной страницей карты.
+
+    Скриншоты снимаются параллельно, по одному на браузер; браузер, который упал
+    или перестал отвечать, закрывается и заменяется новым. Если новый браузер не
+    запускается, пул уменьшается на один браузер, а ошибка передаётся маршруту.
+    """
+
+    def __init__(self, size, page_url, window_size=(1000, 1000), timeout=20):
+        self.size = size
+        self.page_url = page_url
+        self.window_size = window_size
+        self.timeout = timeout
+        # chromedriver ставится один раз на весь пул
+        self.driver_path = ChromeDriverManager().install()
+        self._idle = queue.Queue()
+        self._size_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            for driver in executor.map(lambda _: self._start(), range(size)):
+                self._idle.put(driver)
+
+    def _start(self):
+        options = Options()
+        options.add_argument('--headless=new')
+        options.add_argument(f'--window-size={self.window_size[0]},{self.window_size[1]}')
+        options.add_argument('--hide-scrollbars')
+        driver = webdriver.Chrome(service=Service(self.driver_path), options=options)
+        driver.get(self.page_url)
+        WebDriverWait(driver, self.timeout).until(lambda d: d.execute_script('return window.mapLoaded === true'))
+        return driver
+
+    def _recycle(self, driver):
+        """Закрыть браузер и запустить новый; если он не запустился, пул уменьшается, а ошибка пробрасывается."""
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        for attempt in range(RESTART_ATTEMPTS):
+            try:
+                return self._start()
+            except Exception as e:
+                error = e
+                logging.warning(f'Не удалось запустить браузер ({e.__class__.__name__}), попытка {attempt + 1}')
+        with self._size_lock:
+            self.size -= 1
+        logging.error(f'Браузер не запущен, в пуле осталось браузеров: {self.size}')
+        raise error
+
+    @staticmethod
+    def _alive(driver):
+        try:
+            driver.execute_script('return 1')
+            return True
+        except WebDriverException:
+            return False
+
+    def _acquire(self):
+        # Ждём свободный браузер, пока в пуле есть хоть один
+        while True:
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                if self.size <= 0:
+                    raise RuntimeError('В пуле не осталось браузеров: ни один не удалось перезапустить')
+
+    def screenshot_route(self, dep, dest):
+        """PNG-байты скриншота карты с маршрутом dep -> dest ((lat, lng), (lat, lng))."""
+        driver = self._acquire()
+        try:
+            for attempt in range(2):
+                try:
+                    driver.execute_script('window.showRoute(arguments[0], arguments[1], arguments[2], arguments[3]);',
+                                          dep[0], dep[1], dest[0], dest[1])
+                    WebDriverWait(driver, self.timeout).until(lambda d: d.execute_script('return window.mapReady === true'))
+                    return driver.get_screenshot_as_png()
+                except WebDriverException as e:
+                    if attempt:
+                        raise
+                    logging.warning(f'Браузер не отвечает ({e.__class__.__name__}), перезапуск')
+                    # Закрытый браузер не должен вернуться в пул, даже если новый не запустится
+                    old_driver, driver = driver, None
+                    driver = self._recycle(old_driver)
+        finally:
+            self._release(driver)
+
+    def _release(self, driver):
+        """Вернуть в пул живой браузер; неживой заменяется новым."""
+        if driver is None:
+            return
+        if not self._alive(driver):
+            try:
+                driver = self._recycle(driver)
+            except Exception:
+                return
+        self._idle.put(driver)
+
+    def screenshot_routes(self, routes):
+        """Скриншоты для списка (dep, dest) параллельно; результаты (png или исключение) в порядке маршрутов."""
+        def capture(route):
+            try:
+                return self.screenshot_route(*route), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            yield from executor.map(capture, routes)
+
+    def close(self):
+        while not self._idle.empty():
+            try:
+                self._idle.get_nowait().quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,102 @@
+import csv
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# Компактный индекс: код города/аэропорта -> координаты, без сетевых запросов.
+# Исходные данные лежат в city_codes.csv, бинарный индекс city_codes.idx
+# собирается из него (python city_code_index.py) и читается через mmap.
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'city_codes.csv')
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'city_codes.idx')
+
+MAGIC = b'CCX1'
+# Заголовок: сигнатура, число записей, CRC32 исходного CSV
+HEADER = struct.Struct('<4sII')
+# Запись: код (4 байта ASCII), широта, долгота (float32), CRC32 нормализованной страны
+RECORD = struct.Struct('<4sffI')
+
+def _country_hash(country):
+    return zlib.crc32(' '.join(country.split()).casefold().encode('utf-8'))
+
+def _encode_code(code):
+    return code.strip().upper().encode('ascii')[:4].ljust(4, b' ')
+
+def build_index(source_path=SOURCE_PATH, index_path=INDEX_PATH):
+    """Собрать бинарный индекс из CSV; записи отсортированы по коду для двоичного поиска."""
+    with open(source_path, 'rb') as source:
+        source_crc = zlib.crc32(source.read())
+    with open(source_path, newline='', encoding='utf-8') as source:
+        records = {}
+        for row in csv.DictReader(source):
+            records[_encode_code(row['code'])] = (float(row['lat']), float(row['lng']), _country_hash(row['country']))
+    data = bytearray(HEADER.pack(MAGIC, len(records), source_crc))
+    for code in sorted(records):
+        data += RECORD.pack(code, *records[code])
+    tmp_path = f'{index_path}.tmp'
+    with open(tmp_path, 'wb') as index_file:
+        index_file.write(data)
+    os.replace(tmp_path, index_path)
+    return len(records)
+
+class CityCodeIndex:
+    """Индекс, отображённый в память; поиск кода — двоичный поиск по записям фиксированной длины."""
+
+    def __init__(self, index_path=INDEX_PATH):
+        with open(index_path, 'rb') as index_file:
+            self._buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.source_crc = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{index_path} не является индексом кодов городов')
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._buffer, HEADER.size + position * RECORD.size)
+
+    def lookup(self, code, country=None):
+        """(lat, lng) для кода или None. Если указана страна, она должна совпасть с индексом."""
+        if not code:
+            return None
+        key = _encode_code(code)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                _, lat, lng, country_hash = record
+                if country is not None and country_hash != _country_hash(country):
+                    return None
+                # float32 даёт ~7 значащих цифр, а в city_codes.csv координаты с 4 знаками после запятой
+                return round(lat, 4), round(lng, 4)
+        return None
+
+    def close(self):
+        self._buffer.close()
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Индекс, загружаемый один раз за запуск; пересобирается, если city_codes.csv изменился."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if os.path.exists(SOURCE_PATH):
+                with open(SOURCE_PATH, 'rb') as source:
+                    source_crc = zlib.crc32(source.read())
+                stale = True
+                if os.path.exists(INDEX_PATH):
+                    with open(INDEX_PATH, 'rb') as index_file:
+                        header = index_file.read(HEADER.size)
+                    stale = len(header) < HEADER.size or HEADER.unpack(header)[2] != source_crc
+                if stale:
+                    build_index()
+            _index = CityCodeIndex()
+    return _index
+
+if __name__ == '__main__':
+    print(f'Индекс {INDEX_PATH} собран: {build_index()} кодов')
@@ -0,0 +1,39 @@
+import hashlib
+import json
+import os
+
+# Manifests of processed files, shared by the map branding step and the JSON parsers:
+# a file is skipped when its hash (and whatever else its entry records) is unchanged.
+
+def file_digest(path):
+    """SHA-256 of a file's content, e.g. of a logo for a render key; None when the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(path):
+    if os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+def save_manifest(path, manifest):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def source_digest(path, previous):
+    """Hash and stat of a file; the hash is taken from its manifest entry without reading the file
+    when the size and mtime are unchanged."""
+    stat = os.stat(path)
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return previous['source'], stat
+    return file_digest(path), stat
@@ -0,0 +1,358 @@
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from openpyxl import Workbook, load_workbook
+from batch_generation import DEFAULT_POLL_INTERVAL, run_batch
+from packed_generation import DEFAULT_PACK_SIZE, MAX_PACKED_TOKENS
+from prompt_templates import template_fields
+from rate_limiter import RATE_LIMIT_MODES, get_rate_limiter
+from route_journal import RouteJournal, read_journal, route_key
+from response_cache import CACHE_MODES, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_SIZE_MB
+from run_metrics import request_context, start_metrics, stop_metrics
+from seo_json import RouteJsonWriter
+
+DEFAULT_MAX_CONCURRENCY = 8
+# Files a run can write: the workbook, the final JSON array and JSON Lines
+OUTPUT_FORMATS = ('xlsx', 'json', 'jsonl')
+
+ROUTE_COLUMNS = [
+    'Lead Departure City code', 'Lead Departure City', 'Lead Departure Country',
+    'Lead Destination City code', 'Lead Destination City', 'Lead Destination Country'
+]
+
+def add_generation_arguments(parser):
+    """Register the command line options shared by the content generators."""
+    parser.add_argument(
+        "--input", default=None, metavar="CSV",
+        help="City pairs CSV (default: departures_destinations.csv next to the script)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+        help=f"Maximum number of OpenAI requests in flight at once (default: {DEFAULT_MAX_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--cache", choices=CACHE_MODES, default="use",
+        help="Response cache mode: 'use' answers repeated prompts from disk, "
+             "'refresh' regenerates and overwrites them, 'off' bypasses the cache"
+    )
+    parser.add_argument(
+        "--cache-max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+        help=f"Evict cached answers older than this many days (default: {DEFAULT_MAX_AGE_DAYS})"
+    )
+    parser.add_argument(
+        "--cache-max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB,
+        help=f"Evict least recently used answers above this cache size (default: {DEFAULT_MAX_SIZE_MB})"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip routes already recorded in the journal of a previous, interrupted run"
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Submit all section prompts as offline Batch API jobs and wait for the results "
+             "instead of sending them one by one"
+    )
+    parser.add_argument(
+        "--batch-poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+        help=f"Seconds between batch status checks (default: {DEFAULT_POLL_INTERVAL})"
+    )
+    parser.add_argument(
+        "--pack", type=int, nargs="?", const=DEFAULT_PACK_SIZE, default=None, metavar="SECTIONS",
+        help=f"Ask for up to SECTIONS sections (default: {DEFAULT_PACK_SIZE}) in one request with a JSON answer, "
+             f"as many as fit in {MAX_PACKED_TOKENS} output tokens; sections missing from the answer are generated "
+             "one by one"
+    )
+    parser.add_argument(
+        "--rate-limit", choices=RATE_LIMIT_MODES, default="auto",
+        help="'auto' paces requests to stay just under the request and token limits reported in the "
+             "rate-limit response headers; 'off' sends them as fast as --concurrency allows"
+    )
+    parser.add_argument(
+        "--rpm", type=int, default=None,
+        help="Requests per minute to pace to before the API reports its limit (default: learned from the headers)"
+    )
+    parser.add_argument(
+        "--tpm", type=int, default=None,
+        help="Tokens per minute to pace to before the API reports its limit (default: learned from the headers)"
+    )
+    parser.add_argument(
+        "--vary-per-route", action="store_true",
+        help="Generate sections that depend only on the destination separately for every route "
+             "instead of sharing one answer between all routes to that destination"
+    )
+    parser.add_argument(
+        "--progress", action="store_true",
+        help="Show a live progress line with routes per minute, ETA, tokens and estimated cost "
+             "instead of one line per route"
+    )
+    parser.add_argument(
+        "--output-format", nargs="+", choices=OUTPUT_FORMATS, default=["xlsx"], metavar="FORMAT",
+        help="Files to write for the run: xlsx (the workbook), json (the final depCity/destCity JSON, "
+             "as bilingual_parser_to_JSON.py produces it) and/or jsonl (the same, one route per line); "
+             "default: xlsx"
+    )
+    parser.add_argument(
+        "--api-base", default=None,
+        help="Base URL of the OpenAI-compatible API, e.g. a local stub server (default: OPENAI_API_BASE "
+             "or https://api.openai.com/v1)"
+    )
+    return parser
+
+def iter_routes(city_pairs):
+    """Yield the six route columns of every city pair as a tuple."""
+    return city_pairs[ROUTE_COLUMNS].itertuples(index=False, name=None)
+
+def destination_only_sections(templates):
+    """Indices of the sections whose prompt depends on nothing but the destination city."""
+    return {index for index, template in enumerate(templates) if template_fields(template) <= {"destination_city"}}
+
+class VariedPrompt(str):
+    """A prompt that is answered separately for every departure city.
+
+    The variation becomes the sampling seed of the request, which also keeps the cached
+    and batched answers of otherwise identical prompts apart.
+    """
+
+    def __new__(cls, text, variation):
+        prompt = super().__new__(cls, text)
+        # Keep what the text carries, such as the section and route values of a section prompt
+        prompt.__dict__.update(getattr(text, "__dict__", {}))
+        prompt.variation = variation
+        return prompt
+
+    @property
+    def seed(self):
+        return zlib.crc32(self.variation.encode("utf-8"))
+
+def prompt_seed(prompt):
+    """Sampling seed of a VariedPrompt, None for a plain prompt."""
+    return getattr(prompt, "seed", None)
+
+def vary_prompts(build_prompts, sections):
+    """build_prompts replacement whose `sections` are varied per departure city."""
+    def build_varied_prompts(departure_city, destination_city):
+        prompts = build_prompts(departure_city, destination_city)
+        return [VariedPrompt(prompt, departure_city) if index in sections else prompt
+                for index, prompt in enumerate(prompts)]
+    return build_varied_prompts
+
+def read_rows(path):
+    """Rows written by a previous run, read from its journal (.jsonl) or its workbook (.xlsx)."""
+    if path.endswith(".jsonl"):
+        return list(read_journal(path).values())
+    wb = load_workbook(path, read_only=True)
+    try:
+        ws = wb["Promotions"] if "Promotions" in wb.sheetnames else wb.active
+        return [list(row) for row in ws.iter_rows(min_row=2, values_only=True)]
+    finally:
+        wb.close()
+
+def generate_rows(routes, build_prompts, call_api, max_concurrency=DEFAULT_MAX_CONCURRENCY, packer=None,
+                  shared_sections=None):
+    """Yield one workbook row per route tuple, in input order, or None for a route that failed.
+
+    Section prompts are sent through a pool of `max_concurrency` threads, and the
+    prompts of up to `max_concurrency` routes are queued ahead of the route being
+    written, so the pool stays busy while memory stays bounded.
+
+    With a `packer` (packed_generation.SectionPacker) the sections of a route are
+    requested in packs instead of one request per section.
+
+    Sections listed in `shared_sections` are requested once per distinct prompt and
+    their answer is reused by every later route with the same prompt.
+    """
+    max_concurrency = max(1, max_concurrency)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = deque()
+    # Prompt -> (future, position in a packed answer) of the shared sections requested so far
+    shared = {}
+    reused = 0
+    try:
+        for route in routes:
+            departure_city, destination_city = route[1], route[4]
+            prompts = build_prompts(departure_city, destination_city)
+            sections = [None] * len(prompts)
+            new = []
+            for index, prompt in enumerate(prompts):
+                if shared_sections and index in shared_sections and prompt in shared:
+                    sections[index] = shared[prompt]
+                    reused += 1
+                else:
+                    new.append(index)
+            key = route_key(route)
+            if packer is None:
+                for index in new:
+                    sections[index] = (executor.submit(_in_context, call_api, prompts[index], route=key, section=index),
+                                       None)
+            else:
+                for group in packer.groups(new, prompts):
+                    future = executor.submit(_in_context, packer.generate, [prompts[index] for index in group], group,
+                                             route=key)
+                    for position, index in enumerate(group):
+                        sections[index] = (future, position)
+            if shared_sections:
+                for index in new:
+                    if index in shared_sections:
+                        shared[prompts[index]] = sections[index]
+            pending.append((route, sections))
+            if len(pending) > max_concurrency:
+                yield _collect_row(*pending.popleft())
+        while pending:
+            yield _collect_row(*pending.popleft())
+    finally:
+        # Drop queued prompts if the consumer stopped early or a request failed
+        executor.shutdown(wait=True, cancel_futures=True)
+        if reused:
+            print(f"Reused {reused} destination-only section answers across routes")
+
+def _in_context(function, *args, **fields):
+    """Call function(*args) with route/section fields attached to its requests in the run metrics."""
+    with request_context(**fields):
+        return function(*args)
+
+def _collect_row(route, sections):
+    try:
+        # A packed future answers several sections at once; position picks this section
+        return list(route) + [future.result() if position is None else future.result()[position]
+                              for future, position in sections]
+    except Exception as e:
+        print(f"Failed to generate content for {route[1]} - {route[4]}: {e}")
+        return None
+
+def create_promos_workbook(city_pairs, headers, build_prompts, call_api, file_prefix,
+                           max_concurrency=DEFAULT_MAX_CONCURRENCY, resume=False, build_request=None,
+                           batch_poll_interval=DEFAULT_POLL_INTERVAL, packer=None, shared_sections=None,
+                           vary_per_route=False, progress=False, output_formats=("xlsx",), json_templates=None):
+    """Generate content for every city pair and save it to a timestamped workbook in Promos/.
+
+    Finished rows are appended to Promos/<file_prefix>_journal.jsonl as they are produced;
+    with `resume` the routes found in that journal are copied over instead of regenerated.
+    The workbook is written in write-only mode, so rows are streamed rather than kept in memory.
+
+    When `build_request` is given, the sections of all pending routes are generated
+    through the Batch API first and the rows are filled from the batch results.
+    Otherwise a `packer` requests several sections of a route at once.
+
+    The `shared_sections` (see destination_only_sections) are generated once per
+    destination and reused across routes, unless `vary_per_route` asks for a separate
+    answer for every departure city.
+
+    Every request is measured (tokens, latency, status, retries, section); the metrics
+    are written next to the workbook as <name>_requests.csv and <name>_metrics.json.
+    With `progress` a live status line replaces the per-route messages.
+
+    `output_formats` picks the files written: the xlsx workbook and/or the final JSON
+    (json, jsonl), converted route by route with the section title `json_templates`,
+    so the JSON needs no workbook round-trip through the parser.
+    """
+    now = datetime.now()
+    formatted_date_time = now.strftime("%Y%m%d_%H%M")
+    directory = "Promos"
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    output_file = f"{directory}/{file_prefix}_{formatted_date_time}.xlsx"
+    metrics = start_metrics(f"{directory}/{file_prefix}_{formatted_date_time}_requests.csv")
+    report_file = f"{directory}/{file_prefix}_{formatted_date_time}_metrics.json"
+    failed = 0
+    routes_done = 0
+    summary = None
+    finished = False
+    try:
+        journal_file = f"{directory}/{file_prefix}_journal.jsonl"
+        outputs = []
+        if "xlsx" in output_formats:
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Promotions")
+            ws.append(headers)
+            outputs.append(ws)
+        json_writers = [
+            RouteJsonWriter(f"{directory}/{file_prefix}_{formatted_date_time}.{output_format}", headers,
+                            json_templates, output_format)
+            for output_format in ("json", "jsonl") if output_format in output_formats
+        ]
+        outputs.extend(json_writers)
+        if vary_per_route and shared_sections:
+            build_prompts = vary_prompts(build_prompts, shared_sections)
+            shared_sections = None
+
+        # An interrupted run leaves no partial JSON files; its routes are in the journal for --resume
+        try:
+            with RouteJournal(journal_file, resume=resume) as journal:
+                routes = list(iter_routes(city_pairs))
+                done = [journal.is_completed(route) for route in routes]
+                if journal.completed:
+                    print(f"Resuming: {sum(done)} of {len(routes)} routes already in {journal_file}")
+                pending = [route for route, is_done in zip(routes, done) if not is_done]
+                if build_request is not None:
+                    call_api = run_batch(pending, build_prompts, build_request, f"{directory}/{file_prefix}_batch",
+                                         resume=resume, poll_interval=batch_poll_interval)
+                    # Batch results are looked up per section, so there is nothing left to pack
+                    packer = None
+                generated = generate_rows(pending, build_prompts, call_api, max_concurrency, packer, shared_sections)
+                for route, is_done in zip(routes, done):
+                    if is_done:
+                        for output in outputs:
+                            output.append(journal.completed[route_key(route)])
+                        continue
+                    row_data = next(generated)
+                    routes_done += 1
+                    if progress:
+                        print("\r" + metrics.progress_line(routes_done, len(pending)), end="", flush=True)
+                    if row_data is None:
+                        failed += 1
+                        continue
+                    journal.append(row_data)
+                    for output in outputs:
+                        output.append(row_data)
+                    if not progress:
+                        print(f"Generated content for {row_data[1]} - {row_data[4]}")
+                if progress and pending:
+                    print()
+                generated.close()
+        except BaseException:
+            for writer in json_writers:
+                writer.discard()
+            raise
+
+        if "xlsx" in output_formats:
+            wb.save(output_file)
+            print("Excel file saved as:", output_file)
+        for writer in json_writers:
+            writer.close()
+            print("JSON file saved as:", writer.path)
+        if json_writers and json_writers[0].malformed:
+            print(f"Skipped {json_writers[0].malformed} FAQ entries with an incorrect format in the JSON output")
+        finished = True
+    finally:
+        # A failed or interrupted run still gets its partial report, and the metrics are always closed
+        try:
+            summary = metrics.write_report(report_file, routes_done - failed,
+                                           section_names=headers[len(ROUTE_COLUMNS):])["run"]
+            if not finished:
+                print("Metrics of the interrupted run saved as:", report_file)
+        except Exception as e:
+            print(f"Failed to write the metrics report {report_file}: {e}")
+        finally:
+            stop_metrics()
+
+    if summary is not None:
+        print(f"Requests: {summary['requests']} ({summary['cached']} cached, {summary['failed']} failed, "
+              f"{summary['retries']} retries), tokens: {summary['prompt_tokens']} prompt "
+              f"({summary['cached_prompt_tokens']} from the prompt cache, {summary['cached_prompt_ratio'] or 0:.1%}) + "
+              f"{summary['completion_tokens']} completion, estimated cost: ${summary['estimated_cost_usd']:.4f}")
+        print("Metrics saved as:", report_file)
+    limiter = get_rate_limiter()
+    if limiter is not None and (limiter.waited or limiter.rate_limited):
+        pacing = limiter.summary()
+        print(f"Rate limiter: {pacing['wait_s']:.1f} s spent waiting for quota (summed over workers), "
+              f"{pacing['rate_limited']} 429 responses "
+              f"(limits: {pacing['rpm_limit'] or '?'} requests/min, {pacing['tpm_limit'] or '?'} tokens/min)")
+    if packer is not None:
+        print(f"Packed requests: {packer.requests}, sections generated one by one after a packed answer "
+              f"missed them: {packer.fallbacks}")
+    if failed:
+        print(f"{failed} routes failed and were left out; rerun with --resume to generate only those")
+    print("Done")
+    return output_file if "xlsx" in output_formats else json_writers[0].path
@@ -0,0 +1,126 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+from city_code_index import get_index
+from keys import GOOGLE_MAPS_API_KEY
+
+# Общее хранилище координат для Static_maps_generator.py и html_map_generator.py
+GEOCODE_DB_PATH = os.path.join('.cache', 'geocode.sqlite')
+GEOCODE_CONCURRENCY = 8
+# Адрес Google Maps API; GOOGLE_MAPS_API_BASE позволяет направить запросы на локальный сервер-заглушку
+MAPS_API_BASE = os.environ.get('GOOGLE_MAPS_API_BASE', 'https://maps.googleapis.com').rstrip('/')
+
+# Функция для геокодирования города
+def geocode_city(city, country):
+    try:
+        response = http_client.get(
+            f'{MAPS_API_BASE}/maps/api/geocode/json',
+            params={'address': f'{city}, {country}', 'key': GOOGLE_MAPS_API_KEY},
+            timeout=(5, 30), hedge=True
+        )
+        if response.status_code == 200:
+            results = response.json().get('results')
+            if results:
+                location = results[0]['geometry']['location']
+                logging.info(f'Геокодирование успешно для {city}, {country}: {location["lat"]}, {location["lng"]}')
+                return location['lat'], location['lng']
+        logging.error(f'Ошибка геокодирования для {city}, {country}: {response.status_code}')
+    except Exception as e:
+        logging.error(f'Исключение при геокодировании для {city}, {country}: {e}')
+    return None, None
+
+# Ключ хранилища: город и страна без лишних пробелов и без учёта регистра
+def normalize_key(city, country):
+    return f"{' '.join(city.split()).casefold()}|{' '.join(country.split()).casefold()}"
+
+class GeocodeStore:
+    """SQLite-хранилище координат городов, общее для всех потоков."""
+
+    def __init__(self, path=GEOCODE_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS geocodes ('
+            ' key TEXT PRIMARY KEY, city TEXT, country TEXT,'
+            ' lat REAL NOT NULL, lng REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            # Запросы порциями, чтобы не упереться в лимит параметров SQLite
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for key, lat, lng in self._conn.execute(
+                    f'SELECT key, lat, lng FROM geocodes WHERE key IN ({placeholders})', chunk
+                ):
+                    found[key] = (lat, lng)
+        return found
+
+    def put(self, city, country, lat, lng):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO geocodes (key, city, country, lat, lng, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (normalize_key(city, country), city, country, lat, lng, time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def resolve_cities(cities, store=None, max_workers=GEOCODE_CONCURRENCY):
+    """Координаты для (город, страна) или (город, страна, код): {normalize_key: (lat, lng)}.
+
+    Каждый уникальный город сначала ищется по коду в офлайн-индексе, затем в хранилище,
+    а оставшиеся геокодируются параллельно и сохраняются. Неудачное геокодирование
+    не кэшируется и даёт (None, None).
+    """
+    unique = {}
+    for city, country, *code in cities:
+        entry = unique.setdefault(normalize_key(city, country), [city, country, None])
+        if code and code[0] and not entry[2]:
+            entry[2] = code[0]
+
+    coordinates = {}
+    try:
+        index = get_index()
+        for key, (city, country, code) in unique.items():
+            location = index.lookup(code, country)
+            if location:
+                coordinates[key] = location
+    except (OSError, ValueError) as e:
+        logging.error(f'Индекс кодов городов недоступен: {e}')
+    from_index = len(coordinates)
+
+    own_store = store is None
+    store = store or GeocodeStore()
+    try:
+        coordinates.update(store.get_many(key for key in unique if key not in coordinates))
+        missing = [key for key in unique if key not in coordinates]
+        logging.info(f'Уникальных городов: {len(unique)}, из индекса кодов: {from_index}, '
+                     f'из хранилища: {len(coordinates) - from_index}, геокодируется: {len(missing)}')
+
+        def resolve(key):
+            city, country, _ = unique[key]
+            lat, lng = geocode_city(city, country)
+            if lat is not None and lng is not None:
+                store.put(city, country, lat, lng)
+            return key, (lat, lng)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                coordinates.update(executor.map(resolve, missing))
+    finally:
+        if own_store:
+            store.close()
+    return coordinates
@@ -1,50 +1,52 @@
 import os
 import csv
-import requests
 import datetime
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import argparse
+from browser_pool import BrowserPool, write_pool_page
+from file_manifest import file_digest
+from geocoding import normalize_key, resolve_cities
+from map_image_store import MapImageStore, render_key
+from map_pipeline import BRANDED_DIR, LOGO_PATH, brand_png, branding_settings, load_logo
 from keys import GOOGLE_MAPS_API_KEY
 
 # Настройка логирования
 logging.basicConfig(filename='log.txt', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
 
+parser = argparse.ArgumentParser(description='Генерация HTML-карт маршрутов и их PNG-скриншотов')
+parser.add_argument('--browsers', type=int, default=4, help='Число браузеров в пуле (по умолчанию 4)')
+parser.add_argument('--brand', action='store_true',
+                    help=f'Сразу обрезать скриншот и наложить логотип, как add_logos_to_maps.py, и сохранить в {BRANDED_DIR}')
+args = parser.parse_args()
+
 # Создание директорий для HTML и PNG файлов
 html_dir = 'Results/html_map'
-png_dir = 'Results/html_map_png'
+png_dir = BRANDED_DIR if args.brand else 'Results/html_map_png'
 os.makedirs(html_dir, exist_ok=True)
 os.makedirs(png_dir, exist_ok=True)
 
-# Функция для геокодирования города
-def geocode_city(city, country):
-    try:
-        response = requests.get(
-            'https://maps.googleapis.com/maps/api/geocode/json',
-            params={'address': f'{city}, {country}', 'key': GOOGLE_MAPS_API_KEY}
-        )
-        if response.status_code == 200:
-            results = response.json().get('results')
-            if results:
-                location = results[0]['geometry']['location']
-                logging.info(f'Геокодирование успешно для {city}, {country}: {location["lat"]}, {location["lng"]}')
-                return location['lat'], location['lng']
-        logging.error(f'Ошибка геокодирования для {city}, {country}: {response.status_code}')
-    except Exception as e:
-        logging.error(f'Исключение при геокодировании для {city}, {country}: {e}')
-    return None, None
+# Хранилище готовых карт; логотип накладывается на скриншот, поэтому его хэш входит в ключ
+store = MapImageStore()
+logo_digest = file_digest(LOGO_PATH)
+logo = load_logo(LOGO_PATH)
+# Без --brand скриншот не обрезается, логотип только накладывается в нижний левый угол
+branding = branding_settings() if args.brand else branding_settings(crop_height=0)
+
+# Маршруты, для которых нужен скриншот
+pending = []
 
 # Чтение CSV-файла и генерация HTML-файлов и PNG-изображений
 with open('departures_destinations.csv', newline='', encoding='utf-8') as csvfile:
     reader = csv.DictReader(csvfile)
-    for row in reader:
+    rows = list(reader)
+
+    # Координаты уникальных городов: офлайн-индекс по коду, хранилище, затем геокодирование
+    coordinates = resolve_cities(
+        [(row["Lead Departure City"], row["Lead Departure Country"], row["Lead Departure City code"]) for row in rows] +
+        [(row["Lead Destination City"], row["Lead Destination Country"], row["Lead Destination City code"]) for row in rows]
+    )
+
+    for row in rows:
         departure_city_code = row["Lead Departure City code"]
         departure_city = row["Lead Departure City"]
         departure_country = row["Lead Departure Country"]
@@ -54,14 +56,26 @@ with open('departures_destinations.csv', newline='', encoding='utf-8') as csvfil
 
         logging.info(f'Обработка пары: {departure_city} - {destination_city}')
 
-        dep_lat, dep_lng = geocode_city(departure_city, departure_country)
-        dest_lat, dest_lng = geocode_city(destination_city, destination_country)
+        dep_lat, dep_lng = coordinates[normalize_key(departure_city, departure_country)]
+        dest_lat, dest_lng = coordinates[normalize_key(destination_city, destination_country)]
 
         if dep_lat and dep_lng and dest_lat and dest_lng:
             date_str = datetime.datetime.now().strftime('%d%m')
             html_filename = f'{html_dir}/{departure_city}_{destination_city}_map_{date_str}.html'
             png_filename = f'{png_dir}/{departure_city}_{destination_city}_map_{date_str}.png'
 
+            key = render_key(
+                backend='html', coordinates=[dep_lat, dep_lng, dest_lat, dest_lng], size='1000x1000',
+                maptype='roadmap', path='color:#0000FF|weight:2|geodesic:true', language='es', logo=logo_digest,
+                branding=branding
+            )
+            if store.has(key):
+                # Карта с такими же параметрами уже есть — браузер не нужен
+                store.link_to(key, png_filename)
+                logging.info(f'PNG файл взят из хранилища: {png_filename}')
+                print(f'PNG файл взят из хранилища: {png_filename}')
+                continue
+
             # Генерация HTML-контента
             html_content = f'''
             <!DOCTYPE html>
@@ -119,57 +133,43 @@ with open('departures_destinations.csv', newline='', encoding='utf-8') as csvfil
             </html>
             '''
 
+            # Сохранение HTML-файла
             try:
-                # Сохранение HTML-файла
                 with open(html_filename, 'w', encoding='utf-8') as html_file:
                     html_file.write(html_content)
                     logging.info(f'HTML файл создан: {html_filename}')
+            except Exception as e:
+                logging.error(f'Ошибка при сохранении HTML для пары {departure_city} - {destination_city}: {e}')
+                print(f'Ошибка при сохранении HTML для пары {departure_city} - {destination_city}: {e}')
 
-                # Настройка Selenium для рендеринга HTML и создания скриншота
-                options = Options()
-                options.headless = True
-                options.add_argument("--window-size=1000,1000")  # Устанавливаем размер окна 1000x1000
-
-                driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-                driver.get(f"file://{os.path.abspath(html_filename)}")
-
-                # Ждем загрузки карты
-                wait = WebDriverWait(driver, 20)
-                wait.until(EC.presence_of_element_located((By.ID, 'map')))
-
-                # Wait for the polyline to be drawn
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'path')))
-
-                # Увеличиваем масштаб карты, чтобы маршрут был полностью виден
-                driver.execute_script("map.fitBounds(map.getBounds());")
+            # Скриншот снимается позже пулом браузеров
+            pending.append((departure_city, destination_city, (dep_lat, dep_lng), (dest_lat, dest_lng), png_filename, key))
 
-                # Добавляем небольшую задержку для полной прорисовки карты
-                driver.implicitly_wait(1)  # Ждем 1 секунду
+        else:
+            logging.error(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
+            print(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
+
+# Скриншоты через пул долгоживущих браузеров: страница карты загружается один раз
+# на браузер, а маршруты подставляются в неё без перезагрузки
+if pending:
+    pool_page = write_pool_page(os.path.abspath(f'{html_dir}/.browser_pool_page.html'), GOOGLE_MAPS_API_KEY)
+    with BrowserPool(min(args.browsers, len(pending)), f'file://{pool_page}') as pool:
+        screenshots = pool.screenshot_routes([(dep, dest) for _, _, dep, dest, _, _ in pending])
+        for (departure_city, destination_city, _, _, png_filename, key), (png_bytes, error) in zip(pending, screenshots):
+            if error is not None:
+                logging.error(f'Ошибка при обработке пары {departure_city} - {destination_city}: {error}')
+                print(f'Ошибка при обработке пары {departure_city} - {destination_city}: {error}')
+                continue
+            try:
+                # Обрезка и логотип в памяти, одно кодирование PNG на маршрут
+                store.put_bytes(key, brand_png(png_bytes, logo, branding))
+                logging.info(f'Логотип добавлен на карту: {png_filename}')
 
-                # Сохранение скриншота
-                driver.save_screenshot(png_filename)
+                # Ссылка на готовую карту в хранилище с датой в имени
+                store.link_to(key, png_filename)
                 logging.info(f'PNG файл создан: {png_filename}')
-
-                # Добавление логотипа (в нижний левый угол)
-                logo_path = 'logo.png'  # Путь к вашему логотипу
-                if os.path.exists(logo_path):
-                    img = mpimg.imread(png_filename)
-                    logo = mpimg.imread(logo_path)
-
-                    fig, ax = plt.subplots()
-                    ax.imshow(img)
-                    ax.imshow(logo, extent=(0, logo.shape[1], 0, logo.shape[0]), alpha=1, zorder=1)
-                    ax.axis('off')
-                    plt.savefig(png_filename, bbox_inches='tight', pad_inches=0)
-                    plt.close()
-                    logging.info(f'Логотип добавлен на карту: {png_filename}')
-
-                driver.quit()
+                print(f'PNG файл создан: {png_filename}')
 
             except Exception as e:
                 logging.error(f'Ошибка при обработке пары {departure_city} - {destination_city}: {e}')
                 print(f'Ошибка при обработке пары {departure_city} - {destination_city}: {e}')
-
-        else:
-            logging.error(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
-            print(f'Ошибка геокодирования для пары: {departure_city} - {destination_city}')
\ No newline at end of file
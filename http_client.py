@@ -0,0 +1,156 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 60)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30
+# Send a duplicate of a slow idempotent request after this many seconds; 0 disables hedging
+DEFAULT_HEDGE_AFTER = float(os.environ.get("HTTP_HEDGE_AFTER", 0)) or None
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+class HttpClient:
+    """requests.Session wrapper with per-host keep-alive pools, timeouts, retries and hedging.
+
+    Failures are retried with jittered exponential backoff. Requests that never reached
+    the server (connect errors) and 429 responses are always retried; read timeouts and
+    5xx responses only for idempotent requests. The returned response carries the
+    number of retries it took in `response.retries`.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 hedge_after=DEFAULT_HEDGE_AFTER, pool_connections=10, pool_maxsize=64):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+
+    def request(self, method, url, idempotent=None, timeout=None, hedge=False, on_response=None, before_retry=None,
+                **kwargs):
+        """Send a request, retrying transient failures.
+
+        Returns the last response once it succeeds or retries are exhausted; raises
+        the last connection error if no response was ever received. `on_response` is
+        called with every response received, including the ones that are retried.
+        `before_retry` is called after the backoff, right before every retry is sent,
+        e.g. to wait for rate-limit quota.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        timeout = timeout or self.timeout
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                if hedge and idempotent and self.hedge_after:
+                    response = self._hedged_send(method, url, timeout, kwargs)
+                else:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt or not idempotent:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if on_response is not None:
+                    on_response(response)
+                retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if not retryable or last_attempt:
+                    response.retries = attempt
+                    return response
+                delay = self._retry_after(response) or self._backoff(attempt)
+                response.close()
+            time.sleep(delay)
+            if before_retry is not None:
+                before_retry()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.backoff_max, max(0.0, seconds))
+
+    def _hedged_send(self, method, url, timeout, kwargs):
+        """Send the request, and a second copy if the first is still running after hedge_after seconds."""
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="http-hedge")
+        send = lambda: self.session.request(method, url, timeout=timeout, **kwargs)
+        futures = [self._hedge_executor.submit(send)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            futures.append(self._hedge_executor.submit(send))
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        winner = next(iter(done))
+        if winner.exception() is not None and len(futures) > 1:
+            # The first copy to finish failed; fall back to the other one
+            winner = futures[1] if winner is futures[0] else futures[0]
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_close_response)
+        return winner.result()
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide client shared by all scripts, so connections to a host are reused."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def configure(**options):
+    """Replace the shared client with one built from the given HttpClient options."""
+    global _client
+    with _client_lock:
+        _client = HttpClient(**options)
+    return _client
+
+def get(url, **kwargs):
+    return get_client().get(url, **kwargs)
+
+def post(url, **kwargs):
+    return get_client().post(url, **kwargs)
@@ -0,0 +1,158 @@
+import io
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw
+from map_pipeline import brand_image, logo_from_bytes
+
+# Офлайн-отрисовка карт маршрутов вместо Google Maps Static API.
+# Подложка берётся из каталога basemap/: либо набор тайлов в схеме XYZ
+# (basemap/tiles/{z}/{x}/{y}.png), либо одно изображение мира в проекции
+# Web Mercator (basemap/world.png, от -180 до 180 и от 85.05 до -85.05).
+BASEMAP_DIR = 'basemap'
+TILE_SIZE = 256
+MAP_SIZE = 1000
+MAX_ZOOM = 12
+PADDING = 60
+PATH_POINTS = 256
+MAX_LATITUDE = 85.05112878
+
+# Стиль как у Static Maps: path=color:0x0000ff|weight:5
+BACKGROUND_COLOR = (170, 211, 223)
+PATH_COLOR = (0, 0, 255)
+PATH_WEIGHT = 5
+MARKER_COLOR = (234, 67, 53)
+MARKER_RADIUS = 9
+# Увеличить при любом изменении отрисовки, чтобы в хранилище карт не использовались старые изображения
+STYLE_VERSION = 1
+
+# Промежуточные точки дуги большого круга (сферическая интерполяция векторов)
+def great_circle_path(dep_lat, dep_lng, dest_lat, dest_lng, points=PATH_POINTS):
+    lat1, lng1, lat2, lng2 = np.radians([dep_lat, dep_lng, dest_lat, dest_lng])
+    start = np.array([np.cos(lat1) * np.cos(lng1), np.cos(lat1) * np.sin(lng1), np.sin(lat1)])
+    end = np.array([np.cos(lat2) * np.cos(lng2), np.cos(lat2) * np.sin(lng2), np.sin(lat2)])
+    omega = np.arccos(np.clip(np.dot(start, end), -1.0, 1.0))
+    t = np.linspace(0.0, 1.0, points)[:, None]
+    if omega < 1e-9:
+        vectors = np.repeat(start[None, :], points, axis=0)
+    else:
+        vectors = (np.sin((1 - t) * omega) * start + np.sin(t * omega) * end) / np.sin(omega)
+    lats = np.degrees(np.arctan2(vectors[:, 2], np.hypot(vectors[:, 0], vectors[:, 1])))
+    # unwrap убирает скачок на 180-м меридиане, чтобы линия оставалась непрерывной
+    lngs = np.degrees(np.unwrap(np.arctan2(vectors[:, 1], vectors[:, 0])))
+    return lats, lngs
+
+# Web Mercator: мировые пиксельные координаты на нулевом уровне масштаба (мир = 256x256)
+def project(lats, lngs):
+    lats = np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)
+    sin_lat = np.sin(np.radians(lats))
+    x = (np.asarray(lngs) + 180.0) / 360.0 * TILE_SIZE
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * TILE_SIZE
+    return x, y
+
+# Наибольший целый масштаб, при котором маршрут с отступами помещается в кадр
+def fit_viewport(x, y, size=MAP_SIZE, padding=PADDING):
+    span_x, span_y = x.max() - x.min(), y.max() - y.min()
+    available = size - 2 * padding
+    zoom = MAX_ZOOM
+    while zoom > 0 and max(span_x, span_y) * 2 ** zoom > available:
+        zoom -= 1
+    return zoom, ((x.min() + x.max()) / 2, (y.min() + y.max()) / 2)
+
+class Basemap:
+    """Источник тайлов подложки; тайлы кэшируются в памяти процесса."""
+
+    def __init__(self, directory=BASEMAP_DIR):
+        self.tiles_dir = os.path.join(directory, 'tiles')
+        if not os.path.isdir(self.tiles_dir):
+            self.tiles_dir = None
+        world_path = os.path.join(directory, 'world.png')
+        self.world = Image.open(world_path).convert('RGB') if os.path.exists(world_path) else None
+        if self.tiles_dir is None and self.world is None:
+            logging.warning(f'Подложка не найдена в {directory}, карты будут без фона')
+        self.tile = lru_cache(maxsize=1024)(self._load_tile)
+
+    def _load_tile(self, zoom, x, y):
+        if self.tiles_dir:
+            tile_path = os.path.join(self.tiles_dir, str(zoom), str(x), f'{y}.png')
+            if os.path.exists(tile_path):
+                return Image.open(tile_path).convert('RGB').resize((TILE_SIZE, TILE_SIZE))
+        if self.world is not None:
+            step_x = self.world.width / 2 ** zoom
+            step_y = self.world.height / 2 ** zoom
+            box = (x * step_x, y * step_y, (x + 1) * step_x, (y + 1) * step_y)
+            return self.world.resize((TILE_SIZE, TILE_SIZE), Image.BILINEAR, box=box)
+        return None
+
+def render_route_map(dep, dest, basemap, size=MAP_SIZE):
+    """Изображение size x size с маршрутом по дуге большого круга и маркерами концов."""
+    lats, lngs = great_circle_path(dep[0], dep[1], dest[0], dest[1])
+    x, y = project(lats, lngs)
+    zoom, (center_x, center_y) = fit_viewport(x, y, size)
+    scale = 2 ** zoom
+    left = int(round(center_x * scale - size / 2))
+    top = int(round(center_y * scale - size / 2))
+
+    image = Image.new('RGB', (size, size), BACKGROUND_COLOR)
+    tiles = 2 ** zoom
+    for tile_y in range(max(0, top // TILE_SIZE), min(tiles, (top + size - 1) // TILE_SIZE + 1)):
+        for tile_x in range(left // TILE_SIZE, (left + size - 1) // TILE_SIZE + 1):
+            # По долготе мир повторяется, поэтому номер тайла берётся по модулю
+            tile = basemap.tile(zoom, tile_x % tiles, tile_y)
+            if tile is not None:
+                image.paste(tile, (tile_x * TILE_SIZE - left, tile_y * TILE_SIZE - top))
+
+    points = np.column_stack((x * scale - left, y * scale - top))
+    draw = ImageDraw.Draw(image)
+    draw.line([tuple(point) for point in points], fill=PATH_COLOR, width=PATH_WEIGHT, joint='curve')
+    for px, py in (points[0], points[-1]):
+        draw.ellipse(
+            (px - MARKER_RADIUS, py - MARKER_RADIUS, px + MARKER_RADIUS, py + MARKER_RADIUS),
+            fill=MARKER_COLOR, outline=(255, 255, 255), width=2
+        )
+    return image
+
+def render_route_png(dep, dest, basemap, size=MAP_SIZE):
+    buffer = io.BytesIO()
+    render_route_map(dep, dest, basemap, size).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+# Подложка и логотип загружаются один раз в каждом рабочем процессе
+_worker_basemap = None
+_worker_logo = None
+_worker_branding = None
+
+def _init_worker(basemap_dir, logo_bytes=None, branding=None):
+    global _worker_basemap, _worker_logo, _worker_branding
+    _worker_basemap = Basemap(basemap_dir)
+    _worker_logo = logo_from_bytes(logo_bytes) if logo_bytes else None
+    _worker_branding = branding
+
+def _render_job(job):
+    dep, dest, png_filename = job
+    try:
+        os.makedirs(os.path.dirname(png_filename) or '.', exist_ok=True)
+        # Запись через временный файл, чтобы не оставить недорисованный PNG
+        tmp_filename = f'{png_filename}.{os.getpid()}.tmp'
+        image = render_route_map(dep, dest, _worker_basemap)
+        if _worker_branding is not None:
+            # Обрезка и логотип до кодирования: в файл записывается сразу готовая карта
+            image = brand_image(image, _worker_logo, _worker_branding)
+        image.save(tmp_filename, format='PNG')
+        os.replace(tmp_filename, png_filename)
+        return png_filename, None
+    except Exception as e:
+        return png_filename, str(e)
+
+def render_route_maps(jobs, basemap_dir=BASEMAP_DIR, max_workers=None, logo_bytes=None, branding=None):
+    """Отрисовать задания ((lat, lng), (lat, lng), png_filename) параллельно на всех ядрах.
+
+    Если заданы настройки branding (map_pipeline.branding_settings), карта сразу обрезается
+    и получает логотип из logo_bytes. Возвращает пары (png_filename, ошибка или None) в порядке заданий.
+    """
+    initargs = (basemap_dir, logo_bytes, branding)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as executor:
+        yield from executor.map(_render_job, jobs, chunksize=16)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import shutil
+
+# Хранилище готовых карт, адресуемое хэшем параметров отрисовки.
+# Файлы с датой в имени в Results/ — жёсткие ссылки (или копии) на файлы хранилища,
+# поэтому повторный запуск в другой день не скачивает и не рисует карты заново.
+STORE_DIR = os.path.join('Results', '.map_store')
+
+def render_key(**params):
+    """Хэш параметров отрисовки: координаты, размер, тип карты, стиль линии, язык и т.д."""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class MapImageStore:
+
+    def __init__(self, directory=STORE_DIR, extension='.png'):
+        self.directory = directory
+        self.extension = extension
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}{self.extension}')
+
+    def has(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def put_bytes(self, key, data):
+        """Атомарно записать изображение: во временный файл и затем os.replace."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Не mkstemp: он создаёт файл с правами 0600, а файлы в Results/ — ссылки на тот же inode
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def put_file(self, key, source_path):
+        with open(source_path, 'rb') as source:
+            return self.put_bytes(key, source.read())
+
+    def link_to(self, key, output_path):
+        """Создать output_path как жёсткую ссылку на файл хранилища, при невозможности — как копию."""
+        stored_path = self.path_for(key)
+        if os.path.lexists(output_path):
+            if os.path.exists(output_path) and os.path.samefile(stored_path, output_path):
+                return output_path
+            os.remove(output_path)
+        try:
+            os.link(stored_path, output_path)
+        except OSError:
+            shutil.copy2(stored_path, output_path)
+        return output_path
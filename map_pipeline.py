@@ -0,0 +1,69 @@
+import io
+import os
+from PIL import Image
+
+# Обработка карты за один проход в памяти: декодирование полученных байтов,
+# обрезка, наложение логотипа и одно итоговое кодирование в PNG.
+# Используется и add_logos_to_maps.py, и генераторами карт в режиме --brand.
+
+# Директория для изображений с логотипом
+BRANDED_DIR = os.path.join('Results', 'static_map_png_with_logo')
+
+# Путь к логотипу
+LOGO_PATH = 'logo.png'
+
+# Настройка отступов для логотипа (в пикселях)
+LOGO_LIFT_HEIGHT = 30  # Отступ по высоте
+LOGO_LEFT_OFFSET = 30  # Отступ от левого края
+
+# Высота, которую нужно обрезать снизу (в пикселях), — строка атрибуции карты
+CROP_HEIGHT = 25
+
+def branding_settings(crop_height=CROP_HEIGHT, lift_height=LOGO_LIFT_HEIGHT, left_offset=LOGO_LEFT_OFFSET):
+    """Настройки наложения; входят в ключи хранилища и манифеста, чтобы их изменение обновляло карты."""
+    return {'crop_height': crop_height, 'logo_lift_height': lift_height, 'logo_left_offset': left_offset}
+
+def load_logo(path=LOGO_PATH):
+    """Логотип в RGBA, полностью загруженный в память; None, если файла нет."""
+    if not os.path.exists(path):
+        return None
+    logo = Image.open(path).convert("RGBA")
+    logo.load()
+    return logo
+
+def logo_from_bytes(data):
+    logo = Image.open(io.BytesIO(data)).convert("RGBA")
+    logo.load()
+    return logo
+
+def brand_image(map_image, logo, settings=None):
+    """Обрезать карту снизу и наложить логотип в нижний левый угол с отступами."""
+    settings = settings or branding_settings()
+    map_image = map_image.convert("RGBA")
+
+    # Обрезка нижней части изображения
+    if settings['crop_height']:
+        map_image = map_image.crop((0, 0, map_image.width, map_image.height - settings['crop_height']))
+
+    # Добавление логотипа с отступами
+    if logo is not None:
+        position = (settings['logo_left_offset'], map_image.height - logo.height - settings['logo_lift_height'])
+        map_image.paste(logo, position, logo)
+    return map_image
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def brand_png(data, logo, settings=None):
+    """PNG-байты карты (скачанной или снятой скриншотом) -> PNG-байты с логотипом, за одно кодирование."""
+    return encode_png(brand_image(Image.open(io.BytesIO(data)), logo, settings))
+
+def brand_file(map_path, output_path, logo, settings=None):
+    """Наложить логотип на файл карты и атомарно записать результат."""
+    image = brand_image(Image.open(map_path), logo, settings)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    image.save(tmp_path, format='PNG')
+    os.replace(tmp_path, output_path)
+    return output_path
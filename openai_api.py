@@ -0,0 +1,111 @@
+import os
+import time
+import requests
+import http_client
+from rate_limiter import estimate_tokens, get_rate_limiter
+from response_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_SIZE_MB, ResponseCache, request_key
+)
+from run_metrics import record_request
+from keys import API_KEY  # Ensure you have this module with API_KEY defined
+
+# Override with OPENAI_API_BASE or --api-base to point the scripts at a proxy or a local stub server
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+NO_ANSWER = "No answer available."
+# Completions can take a while to generate, so allow a long read timeout
+CHAT_TIMEOUT = (10, 180)
+
+_api_base = os.environ.get("OPENAI_API_BASE", DEFAULT_API_BASE).rstrip("/")
+_cache = None
+
+def set_api_base(api_base):
+    global _api_base
+    _api_base = api_base.rstrip("/")
+
+def api_url(path):
+    """Absolute URL of an API path such as '/chat/completions'."""
+    return f"{_api_base}{path}"
+
+def auth_headers():
+    return {"Authorization": f"Bearer {API_KEY}"}
+
+def configure_cache(mode="use", path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                    max_size_mb=DEFAULT_MAX_SIZE_MB):
+    """Set up the response cache used by chat_completion for the rest of the run."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = ResponseCache(path, mode=mode, max_age_days=max_age_days, max_size_mb=max_size_mb)
+    return _cache
+
+def get_cache():
+    if _cache is None:
+        configure_cache()
+    return _cache
+
+def build_payload(messages, model, max_tokens, temperature, seed=None):
+    """Request body for the chat completions endpoint; a seed is only sent when given."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if seed is not None:
+        payload["seed"] = seed
+    return payload
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens of a response's usage that the API read from its prompt prefix cache."""
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+
+def answer_from_body(body):
+    return body['choices'][0]['message']['content']
+
+def chat_completion(payload):
+    """Send a chat completion request, answering from the response cache when possible.
+
+    Raises requests.HTTPError when the API still fails after the client's retries, so
+    a failed section is never written as if it were content.
+    Every call is recorded in the run metrics, see run_metrics.py, and paced by the
+    rate limiter, see rate_limiter.py.
+    """
+    cache = get_cache()
+    key = request_key(payload)
+    cached = cache.get(key)
+    if cached is not None:
+        record_request(model=payload["model"], status=200, cached=True)
+        return cached
+
+    headers = dict(auth_headers(), **{"Content-Type": "application/json"})
+    limiter = get_rate_limiter()
+    hooks = {}
+    if limiter is not None:
+        tokens = estimate_tokens(payload)
+        limiter.acquire(tokens)
+        # Retries wait for quota too, so after a 429 they are paced instead of all resent when the pause ends
+        hooks = {"on_response": limiter.update, "before_retry": lambda: limiter.acquire(tokens)}
+    started = time.perf_counter()
+    try:
+        # Retrying a completion only costs tokens, so it is treated as idempotent
+        response = http_client.post(api_url("/chat/completions"), json=payload, headers=headers,
+                                    idempotent=True, timeout=CHAT_TIMEOUT, **hooks)
+    except requests.RequestException as e:
+        record_request(model=payload["model"], latency_s=time.perf_counter() - started, error=str(e))
+        raise
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        record_request(model=payload["model"], status=response.status_code, retries=response.retries,
+                       latency_s=latency, error=response.text[:200])
+        raise requests.HTTPError(
+            f"OpenAI API returned {response.status_code} after {response.retries} retries: {response.text}",
+            response=response
+        )
+    body = response.json()
+    usage = body.get("usage") or {}
+    record_request(model=body.get("model", payload["model"]), status=200, retries=response.retries, latency_s=latency,
+                   prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0),
+                   cached_prompt_tokens=cached_prompt_tokens(usage))
+    answer = answer_from_body(body)
+    cache.put(key, answer, model=payload["model"])
+    return answer
@@ -0,0 +1,114 @@
+import json
+import threading
+from openai_api import chat_completion
+from prompt_templates import PackedPrompt, join_route_variables, route_variables
+from run_metrics import request_context
+
+# Sections generated together in one request by default: the 12 sections of a route,
+# split further so that every pack fits in MAX_PACKED_TOKENS
+DEFAULT_PACK_SIZE = 12
+# Output limit of the chat models the generators use. A pack only holds as many sections
+# as their usual max_tokens allow, since a truncated answer is invalid JSON and loses them all
+MAX_PACKED_TOKENS = 4096
+
+def section_key(index):
+    return f"section_{index + 1}"
+
+def build_packed_prompt(prompts):
+    """One prompt asking for all the given sections as a JSON object keyed by section."""
+    keys = ", ".join(section_key(index) for index in range(len(prompts)))
+    parts = [
+        "Write each of the sections below for the same travel article.",
+        f"Return a JSON object with exactly these keys: {keys}. The value of each key is the plain text of "
+        "that section, formatted as its instructions ask. Do not nest objects and do not add other keys.",
+    ]
+    # Section prompts keep their static instructions in the pack; the sections of a pack share
+    # the route, so its variables are written once, after all of them. Other prompts are used as they are
+    variables = []
+    for index, prompt in enumerate(prompts):
+        section = getattr(prompt, "section", None)
+        if section is None:
+            parts.append(f"{section_key(index)}:\n{prompt}")
+            continue
+        parts.append(f"{section_key(index)}:\n{section.instructions}")
+        variables.extend(line for line in route_variables(section.fields, prompt.values) if line not in variables)
+    return PackedPrompt(join_route_variables("\n\n".join(parts), variables))
+
+def parse_packed_answer(answer, count):
+    """Section texts from a packed answer, in prompt order; None for a missing or invalid section."""
+    try:
+        sections = json.loads(answer)
+    except (TypeError, ValueError):
+        return [None] * count
+    if not isinstance(sections, dict):
+        return [None] * count
+    texts = []
+    for index in range(count):
+        text = sections.get(section_key(index))
+        texts.append(text.strip() if isinstance(text, str) and text.strip() else None)
+    return texts
+
+class SectionPacker:
+    """Generates several sections of a route with one structured request.
+
+    `build_request` is the generator's per-prompt payload builder, so the packed request
+    keeps its model and system messages. Sections that are missing or invalid in the
+    packed answer are generated with `call_api` from their original prompts.
+    """
+
+    def __init__(self, build_request, call_api, pack_size=DEFAULT_PACK_SIZE):
+        self.build_request = build_request
+        self.call_api = call_api
+        self.pack_size = max(1, pack_size)
+        self.requests = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def section_tokens(self, prompt):
+        """Output tokens a section is allowed when it is requested on its own."""
+        return self.build_request(prompt)["max_tokens"]
+
+    def groups(self, sections, prompts):
+        """Split the sections of a route into packs of at most pack_size sections.
+
+        A pack is closed before the sections' max_tokens add up to more than MAX_PACKED_TOKENS.
+        """
+        packs = []
+        budget = 0
+        for index in sections:
+            tokens = self.section_tokens(prompts[index])
+            if packs and len(packs[-1]) < self.pack_size and budget + tokens <= MAX_PACKED_TOKENS:
+                packs[-1].append(index)
+                budget += tokens
+            else:
+                packs.append([index])
+                budget = tokens
+        return packs
+
+    def build_packed_request(self, prompts):
+        payload = self.build_request(build_packed_prompt(prompts))
+        payload["max_tokens"] = min(MAX_PACKED_TOKENS, sum(self.section_tokens(prompt) for prompt in prompts))
+        payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def generate(self, prompts, sections=None):
+        """Answers for a pack of section prompts, in prompt order; `sections` label them in the run metrics."""
+        sections = sections or list(range(len(prompts)))
+        if len(prompts) == 1:
+            with request_context(section=sections[0]):
+                return [self.call_api(prompts[0])]
+        with self._lock:
+            self.requests += 1
+        try:
+            with request_context(section="packed"):
+                answers = parse_packed_answer(chat_completion(self.build_packed_request(prompts)), len(prompts))
+        except Exception as e:
+            print(f"Packed request failed, generating its sections one by one: {e}")
+            answers = [None] * len(prompts)
+        missing = [index for index, answer in enumerate(answers) if answer is None]
+        with self._lock:
+            self.fallbacks += len(missing)
+        for index in missing:
+            with request_context(section=sections[index]):
+                answers[index] = self.call_api(prompts[index])
+        return answers
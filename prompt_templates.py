@@ -0,0 +1,75 @@
+import string
+
+# How section instructions name the route's cities; the values follow at the end of the prompt
+ROUTE_FIELDS = {
+    "departure_city": "[departure city]",
+    "destination_city": "[destination city]",
+}
+ROUTE_VARIABLES_HEADING = "Route variables:"
+# Static instructions sent after the generator's system messages in every packed request
+ROUTE_VARIABLES_INSTRUCTIONS = (
+    f"{ROUTE_FIELDS['departure_city']} and {ROUTE_FIELDS['destination_city']} stand for the cities listed under "
+    f"'{ROUTE_VARIABLES_HEADING}' at the end; always write their real names."
+)
+
+def template_fields(template):
+    """Names of the fields a prompt template is formatted with."""
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+def route_variables(fields, values):
+    """Lines naming the value of every route field a section uses, e.g. '[destination city] = Havana'."""
+    return [f"{ROUTE_FIELDS[field]} = {values[field]}" for field in fields]
+
+def join_route_variables(instructions, lines):
+    return "\n\n".join([instructions, "\n".join([ROUTE_VARIABLES_HEADING] + lines)]) if lines else instructions
+
+class SectionTemplate:
+    """A section prompt template compiled into static instructions and the route fields they refer to."""
+
+    def __init__(self, template):
+        self.template = template
+        self.fields = [field for field in ROUTE_FIELDS if field in template_fields(template)]
+        self.instructions = template.format_map(ROUTE_FIELDS)
+
+class SectionPrompt(str):
+    """A section prompt: its template filled in with the route's cities.
+
+    It also keeps its section and the field values, so a packed request can use the
+    static instructions of the section and list the cities after them.
+    """
+
+    def __new__(cls, section, values):
+        prompt = super().__new__(cls, section.template.format_map(values))
+        prompt.section = section
+        prompt.values = values
+        return prompt
+
+class PackedPrompt(str):
+    """A prompt asking for several sections at once; it is sent after the registry's preamble."""
+
+    packed = True
+
+class PromptRegistry:
+    """Section prompts of a generator, compiled once when the generator is loaded.
+
+    Packed requests are laid out so the API's prompt prefix cache can reuse as much as
+    possible: the system messages come first and are byte-identical in every request,
+    then the static instructions of all sections, and the city names last. A single
+    section stays below the cache's 1024-token minimum, so it is sent as before: its
+    template filled in with the city names.
+    """
+
+    def __init__(self, system_messages, templates):
+        self.system = [{"role": "system", "content": content} for content in system_messages]
+        self.preamble = self.system + [{"role": "system", "content": ROUTE_VARIABLES_INSTRUCTIONS}]
+        self.sections = [SectionTemplate(template) for template in templates]
+
+    def build_prompts(self, departure_city, destination_city):
+        """Prompts for generating text content, one per section column."""
+        values = {"departure_city": departure_city, "destination_city": destination_city}
+        return [SectionPrompt(section, values) for section in self.sections]
+
+    def messages(self, prompt):
+        """Chat messages of a request: a packed prompt after the preamble, anything else after the system messages."""
+        system = self.preamble if getattr(prompt, "packed", False) else self.system
+        return system + [{"role": "user", "content": prompt}]
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+
+# Modes of --rate-limit: 'auto' learns the limits from the rate-limit response headers
+# (and --rpm/--tpm when given), 'off' sends requests as soon as a worker is free
+RATE_LIMIT_MODES = ("auto", "off")
+# Share of the quota the scheduler aims for, so requests from retries and clock skew still fit
+DEFAULT_HEADROOM = 0.95
+# OpenAI request and token limits are per minute
+LIMIT_WINDOW = 60.0
+# Roughly four characters per token for English text
+CHARS_PER_TOKEN = 4
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value):
+    """Seconds of a reset header such as '1s', '6m0s' or '120ms'; None when it cannot be read."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+def estimate_tokens(payload):
+    """Tokens a chat completion request counts against the token limit: its prompt and its max_tokens.
+
+    The API charges this estimate when the request arrives, whatever the answer's length.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in payload.get("messages", []))
+    return prompt_chars // CHARS_PER_TOKEN + 1 + (payload.get("max_tokens") or 0)
+
+class TokenBucket:
+    """Budget refilled continuously at limit per window; unlimited until a limit is known."""
+
+    def __init__(self, limit=None, window=LIMIT_WINDOW, headroom=DEFAULT_HEADROOM):
+        self.window = window
+        self.headroom = headroom
+        self.limit = None
+        self.level = 0.0
+        self.updated = time.monotonic()
+        if limit:
+            self.set_limit(limit)
+
+    @property
+    def capacity(self):
+        return self.limit * self.headroom
+
+    def set_limit(self, limit):
+        if limit == self.limit:
+            return
+        self._refill()
+        # A bucket learns its limit with a full budget, minus what the server reports as used
+        self.level = limit * self.headroom if self.limit is None else min(self.level, limit * self.headroom)
+        self.limit = limit
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.limit is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.limit / self.window)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` fits in the bucket; 0 when it fits now or there is no limit."""
+        if self.limit is None:
+            return 0.0
+        self._refill()
+        # A request larger than the whole budget waits for a full bucket instead of forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * self.window / self.limit)
+
+    def take(self, amount):
+        if self.limit is not None:
+            self.level -= amount
+
+    def sync(self, remaining):
+        """Lower the budget to what the server reports as remaining, scaled by the headroom."""
+        if self.limit is not None and remaining is not None:
+            self._refill()
+            self.level = min(self.level, remaining - self.limit * (1 - self.headroom))
+
+class RateLimiter:
+    """Paces chat completion requests to stay just under the request and token limits.
+
+    Every request reserves one request and its estimated tokens before it is sent,
+    waiting until both buckets have room. The buckets learn the limits and the remaining
+    budget from the x-ratelimit-* response headers; a 429 pauses all requests for its
+    Retry-After or reset time, so the workers do not pile up more rejected requests.
+    """
+
+    def __init__(self, rpm=None, tpm=None, headroom=DEFAULT_HEADROOM):
+        self.requests = TokenBucket(rpm, headroom=headroom)
+        self.tokens = TokenBucket(tpm, headroom=headroom)
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Block until a request with the estimated number of tokens can be sent, then reserve it."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = max(self.paused_until - time.monotonic(), self.requests.wait_time(1),
+                            self.tokens.wait_time(tokens))
+                if delay <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    self.waited += waited
+                    return
+            # Sleep in short steps, so a pause or a lower limit learned meanwhile is picked up
+            pause = min(delay, 1.0)
+            time.sleep(pause)
+            waited += pause
+
+    def update(self, response):
+        """Learn limits and remaining budgets from a response; pause everything after a 429."""
+        headers = response.headers
+        with self._lock:
+            resets = []
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = _int_header(headers, f"x-ratelimit-limit-{kind}")
+                if limit:
+                    bucket.set_limit(limit)
+                remaining = _int_header(headers, f"x-ratelimit-remaining-{kind}")
+                bucket.sync(remaining)
+                if remaining == 0:
+                    resets.append(parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+            if response.status_code == 429:
+                self.rate_limited += 1
+                # Retry-After when given, else the earliest reset of an exhausted limit; from then
+                # on the refilling buckets pace the requests
+                pause = parse_duration(headers.get("retry-after"))
+                if pause is None:
+                    pause = min([seconds for seconds in resets if seconds is not None], default=1.0)
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def summary(self):
+        return {
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "wait_s": round(self.waited, 3),
+            "rate_limited": self.rate_limited,
+        }
+
+def _int_header(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+_limiter = None
+
+def configure_rate_limiter(mode="auto", rpm=None, tpm=None, headroom=DEFAULT_HEADROOM):
+    """Set up the scheduler used by chat_completion for the rest of the run; mode 'off' disables it."""
+    global _limiter
+    # False marks pacing as switched off, None as not configured yet
+    _limiter = RateLimiter(rpm, tpm, headroom) if mode != "off" else False
+    return _limiter or None
+
+def get_rate_limiter():
+    """The run's rate limiter, None when pacing is off. Limits are learned from the headers by default."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter or None
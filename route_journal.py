@@ -0,0 +1,62 @@
+import json
+import os
+
+def route_key(row):
+    """Identify a route by its six city pair columns."""
+    return "|".join(str(value) for value in row[:6])
+
+def read_journal(path):
+    """Finished rows of a journal keyed by route; lines cut short by a crash are skipped."""
+    completed = {}
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; that route will be generated again
+                continue
+            completed[route_key(row)] = row
+    return completed
+
+class RouteJournal:
+    """Append-only JSON Lines log of finished workbook rows.
+
+    Every row is flushed and fsynced before the next one is written, so a run that
+    crashes or is killed keeps all the routes it already paid for.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self.completed = read_journal(path)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self._file.tell() and not self._ends_with_newline(path):
+            self._file.write("\n")
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            return journal.read(1) == b"\n"
+
+    def is_completed(self, row):
+        return route_key(row) in self.completed
+
+    def append(self, row):
+        self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.completed[route_key(row)] = row
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,219 @@
+import csv
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# USD per million tokens (prompt, completion); dated model names use the price of their family
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# Batch API requests are billed at half price
+BATCH_DISCOUNT = 0.5
+# Prompt tokens answered from the API's prompt prefix cache are billed at half price
+CACHED_PROMPT_DISCOUNT = 0.5
+
+CSV_FIELDS = [
+    "time", "route", "section", "model", "status", "retries", "latency_s",
+    "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "cached", "batch", "cost_usd", "error"
+]
+
+_context = threading.local()
+
+@contextmanager
+def request_context(**fields):
+    """Attach fields such as route and section to the requests made inside the block on this thread."""
+    previous = getattr(_context, "fields", {})
+    _context.fields = dict(previous, **fields)
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+def estimate_cost(model, prompt_tokens, completion_tokens, batch=False, cached_prompt_tokens=0):
+    """Estimated USD cost of a request, or None for a model without a known price."""
+    family = max((name for name in PRICES if model and model.startswith(name)), key=len, default=None)
+    if family is None:
+        return None
+    prompt_price, completion_price = PRICES[family]
+    billed_prompt_tokens = prompt_tokens - cached_prompt_tokens * CACHED_PROMPT_DISCOUNT
+    cost = (billed_prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles of the values, None when there are none."""
+    ordered = sorted(values)
+    return {
+        f"p{point}": ordered[max(0, math.ceil(point / 100 * len(ordered)) - 1)] if ordered else None
+        for point in points
+    }
+
+class _Totals:
+    """Running totals of a group of requests; latencies are kept only where percentiles are reported."""
+
+    def __init__(self, keep_latencies=True):
+        self.requests = 0
+        self.cached = 0
+        self.failed = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_total = 0.0
+        self.latencies = [] if keep_latencies else None
+
+    def add(self, record):
+        self.requests += 1
+        self.cached += bool(record["cached"])
+        self.failed += record["status"] != 200
+        self.retries += record["retries"] or 0
+        self.prompt_tokens += record["prompt_tokens"]
+        self.cached_prompt_tokens += record["cached_prompt_tokens"]
+        self.completion_tokens += record["completion_tokens"]
+        self.cost += record["cost_usd"] or 0.0
+        if record["latency_s"] is not None and not record["cached"]:
+            self.latency_total += record["latency_s"]
+            if self.latencies is not None:
+                self.latencies.append(record["latency_s"])
+
+    def summary(self):
+        summary = {
+            "requests": self.requests,
+            "cached": self.cached,
+            "failed": self.failed,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            # Share of the prompt tokens the API read from its prompt prefix cache
+            "cached_prompt_ratio": (round(self.cached_prompt_tokens / self.prompt_tokens, 4)
+                                    if self.prompt_tokens else None),
+            "completion_tokens": self.completion_tokens,
+            "estimated_cost_usd": round(self.cost, 6),
+            "latency_total_s": round(self.latency_total, 3),
+        }
+        if self.latencies is not None:
+            summary["latency_s"] = {
+                name: None if value is None else round(value, 3)
+                for name, value in percentiles(self.latencies).items()
+            }
+        return summary
+
+def _section_order(section):
+    # Numbered sections in column order, then labels such as "packed" and "batch"
+    return (0, int(section), "") if section.isdigit() else (1, 0, section)
+
+class RunMetrics:
+    """Per-request metrics of a generation run, aggregated per section, per route and per run.
+
+    Every request is also written as a row of the CSV file as soon as it finishes,
+    so the raw numbers survive an interrupted run.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.started = time.monotonic()
+        self.run = _Totals()
+        self.sections = defaultdict(_Totals)
+        self.routes = defaultdict(lambda: _Totals(keep_latencies=False))
+        self._lock = threading.Lock()
+        self._file = open(csv_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+        self._writer.writeheader()
+
+    def record(self, model=None, status=None, retries=0, latency_s=None, prompt_tokens=0, completion_tokens=0,
+               cached_prompt_tokens=0, cached=False, batch=False, error=None):
+        fields = getattr(_context, "fields", {})
+        record = {
+            "time": round(time.time(), 3),
+            "route": fields.get("route", ""),
+            "section": fields.get("section", ""),
+            "model": model,
+            "status": status,
+            "retries": retries,
+            "latency_s": None if latency_s is None else round(latency_s, 4),
+            "prompt_tokens": prompt_tokens or 0,
+            "cached_prompt_tokens": cached_prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cached": cached,
+            "batch": batch,
+            "cost_usd": 0.0 if cached else estimate_cost(model, prompt_tokens or 0, completion_tokens or 0, batch,
+                                                          cached_prompt_tokens or 0),
+            "error": error or "",
+        }
+        with self._lock:
+            self._writer.writerow(record)
+            self.run.add(record)
+            self.sections[str(record["section"])].add(record)
+            if record["route"]:
+                self.routes[record["route"]].add(record)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def summary(self, routes_done=0, section_names=None):
+        """Run, per-section and per-route aggregates; numbered sections are labelled with section_names."""
+        section_names = section_names or []
+        with self._lock:
+            elapsed = self.elapsed()
+            sections = {}
+            for section, totals in sorted(self.sections.items(), key=lambda item: _section_order(item[0])):
+                label = section
+                if section.isdigit() and int(section) < len(section_names):
+                    label = section_names[int(section)]
+                sections[label] = totals.summary()
+            return {
+                "run": dict(
+                    self.run.summary(), routes=routes_done, wall_time_s=round(elapsed, 3),
+                    routes_per_minute=round(routes_done / elapsed * 60, 2) if elapsed else None
+                ),
+                "sections": sections,
+                "routes": {route: totals.summary() for route, totals in self.routes.items()},
+            }
+
+    def write_report(self, json_path, routes_done=0, section_names=None):
+        self._file.flush()
+        summary = self.summary(routes_done, section_names)
+        with open(json_path, 'w', encoding='utf-8') as report_file:
+            json.dump(summary, report_file, ensure_ascii=False, indent=2)
+        return summary
+
+    def progress_line(self, done, total):
+        """One-line status with throughput, ETA, tokens and estimated cost."""
+        elapsed = self.elapsed()
+        rate = done / elapsed * 60 if elapsed and done else 0.0
+        remaining = total - done
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining / rate * 60)) if rate else "--:--:--"
+        with self._lock:
+            tokens = self.run.prompt_tokens + self.run.completion_tokens
+            cost = self.run.cost
+        return (f"{done}/{total} routes | {rate:.1f} routes/min | ETA {eta} | "
+                f"{tokens} tokens | ~${cost:.4f}")
+
+    def close(self):
+        self._file.close()
+
+_metrics = None
+
+def start_metrics(csv_path):
+    """Start collecting metrics for the requests of this run."""
+    global _metrics
+    if _metrics is not None:
+        _metrics.close()
+    _metrics = RunMetrics(csv_path)
+    return _metrics
+
+def stop_metrics():
+    global _metrics
+    if _metrics is not None:
+        _metrics.close()
+    _metrics = None
+
+def record_request(**fields):
+    """Record a finished request when a run is being measured; a no-op otherwise."""
+    if _metrics is not None:
+        _metrics.record(**fields)
@@ -0,0 +1,487 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from openpyxl import load_workbook
+from file_manifest import load_manifest, save_manifest, source_digest
+
+# Shared building blocks of the Excel-to-JSON parsers and of the generators' JSON output.
+# In the parsers columns are matched against the section title templates once per file,
+# and the text conversions run column-wise on the whole workbook instead of row by row;
+# the generators convert each route as soon as it is generated, with the same rules.
+
+FAQ_COLUMN = 'F.A.Q.'
+# Rows converted together when a workbook is streamed
+CHUNK_ROWS = 500
+# json: one array per workbook; jsonl: one route per line; routes: one file per route
+OUTPUT_FORMATS = ('json', 'jsonl', 'routes')
+PLACEHOLDER_PATTERN = re.compile(r'(\{departure_city\}|\{destination_city\})')
+
+# Manifest of converted workbooks in the output folder: source hash and parser version.
+# A workbook is skipped when neither changed and its JSON file is in place.
+MANIFEST_NAME = '.json_manifest.json'
+
+# Section title templates of both content workbooks and their article block ids
+ARTICLE_KEYS = {
+    "spanish": {
+        "Guía definitiva para viajar de {departure_city} a {destination_city}": "articleBlock1",
+        "¿Qué debo saber de {destination_city}?": "articleBlock2",
+        "Vuelos baratos desde {departure_city} a {destination_city}": "articleBlock3",
+        "Cómo llegar desde {departure_city} a {destination_city} en avion": "articleBlock4",
+        "Traslados a la ciudad y alrededores desde el aeropuerto a {destination_city}": "articleBlock5",
+        "Dónde alojarse en {destination_city}?": "articleBlock6",
+        "Los mejores lugares turísticos de {destination_city} que debes conocer": "articleBlock7",
+        "Palabras para saber en {destination_city}": "articleBlock8",
+        "Cosas que debes saber antes de viajar a {destination_city}": "articleBlock9",
+        "Datos curiosos sobre {destination_city}": "articleBlock10",
+        "Prepárate para tu viaje a {destination_city}": "articleBlock11"
+    },
+    "english": {
+        "Your ultimate guide for {departure_city} to {destination_city} travel": "articleBlock1",
+        "What you need to know about {destination_city}?": "articleBlock2",
+        "Unlocking the best {departure_city} to {destination_city} flight deals": "articleBlock3",
+        "Best {departure_city} to {destination_city} itineraries": "articleBlock4",
+        "Transportation to {destination_city} from Airport": "articleBlock5",
+        "Where to stay in {destination_city}?": "articleBlock6",
+        "Top sights and attractions in {destination_city}": "articleBlock7",
+        "Words to know in {destination_city}": "articleBlock8",
+        "What to remember before traveling to {destination_city}": "articleBlock9",
+        "Fun Facts about {destination_city}": "articleBlock10",
+        "Get ready for your trip to {destination_city}": "articleBlock11"
+    }
+}
+
+# In the routes format every workbook gets a folder with one compact file per route,
+# a manifest of their content hashes and the routes that changed since the last run
+ROUTES_MANIFEST = 'routes_manifest.json'
+ROUTE_CHANGES = 'changes.json'
+# The generators name workbooks <prefix>_<YYYYMMDD_HHMM>.xlsx; the route folder drops the date,
+# so every run of a catalogue is compared with the previous one
+WORKBOOK_DATE_SUFFIX = re.compile(r'_\d{8}_\d{4}$')
+
+# Create imageBlock with default placeholders
+IMAGE_BLOCK = {
+    "title": "Placeholder Title",
+    "text": "Placeholder Text"
+}
+
+def normalize_title(title):
+    """Comparable form of a column title: trimmed, case-folded, without a trailing question mark."""
+    return ' '.join(str(title).split()).rstrip('?').strip().casefold()
+
+def map_article_columns(columns, templates):
+    """Match workbook columns to section title templates once per file.
+
+    `templates` maps a title template (with {departure_city}/{destination_city}) to its
+    block id. Returns the (column, block id, template) of every template found, in
+    template order, and the templates that have no column.
+    """
+    by_title = {normalize_title(column): column for column in columns}
+    found, missing = [], []
+    for template, block_id in templates.items():
+        column = by_title.get(normalize_title(template))
+        if column is None:
+            missing.append(template)
+        else:
+            found.append((column, block_id, template))
+    return found, missing
+
+def fill_template(template, departure_cities, destination_cities):
+    """Section titles for every row: the template with the row's cities substituted, built column-wise."""
+    titles = pd.Series('', index=departure_cities.index, dtype=object)
+    for part in PLACEHOLDER_PATTERN.split(template):
+        if part == '{departure_city}':
+            titles = titles + departure_cities.astype(str)
+        elif part == '{destination_city}':
+            titles = titles + destination_cities.astype(str)
+        elif part:
+            titles = titles + part
+    return titles
+
+def html_text(texts):
+    """Line breaks to <br>; texts that contain <li> items become a <ul> list. Empty cells stay NaN."""
+    present = texts.notna()
+    html = texts[present].astype(str).str.replace('\n', '<br>', regex=False)
+    is_list = html.str.contains('<li>', regex=False)
+    html[is_list] = '<ul><li>' + html[is_list].str.replace('<br>', '</li><li>', regex=False) + '</li></ul>'
+    return html.reindex(texts.index)
+
+def faq_blocks(faq, verbose=False):
+    """Question/answer pairs of every row's FAQ cell and the number of entries that could not be parsed.
+
+    Entries are separated by a blank line and hold a "Question N: ..." and an
+    "Answer N: ..." line; anything else is skipped.
+    """
+    blocks = pd.Series([[] for _ in range(len(faq))], index=faq.index, dtype=object)
+    texts = faq[faq.notna()].astype(str)
+    if texts.empty:
+        return blocks, 0
+    entries = texts.str.strip().str.split('\n\n').explode()
+    entries = entries.str.strip().str.replace('\n', '<br>', regex=False)
+    parts = entries.str.split('<br>')
+    well_formed = parts.str.len() == 2
+    questions = parts.str[0].str.split(': ', n=1).str[1]
+    answers = parts.str[1].str.split(': ', n=1).str[1]
+    valid = well_formed & questions.notna() & answers.notna()
+    if verbose:
+        for entry in entries[~well_formed]:
+            print(f"Error processing FAQ entry '{entry}': incorrect format")
+        for entry in entries[well_formed & ~valid]:
+            print(f"Error processing FAQ entry '{entry}': list index out of range")
+    by_row = {}
+    for row, question, answer in zip(entries.index[valid], questions[valid], answers[valid]):
+        by_row.setdefault(row, []).append({"question": question, "answer": answer})
+    blocks.update(pd.Series(by_row, dtype=object))
+    return blocks, int((~valid).sum())
+
+def format_text(text):
+    """Single-text form of html_text: line breaks to <br>, a text with <li> items becomes a <ul> list."""
+    html = str(text).replace('\n', '<br>')
+    if '<li>' in html:
+        html = '<ul><li>' + html.replace('<br>', '</li><li>') + '</li></ul>'
+    return html
+
+def split_faq(text):
+    """Single-text form of faq_blocks: the question/answer pairs and the entries that could not be parsed."""
+    pairs, malformed = [], []
+    for entry in str(text).strip().split('\n\n'):
+        entry = entry.strip().replace('\n', '<br>')
+        parts = entry.split('<br>')
+        question = parts[0].split(': ', 1)[1:] if len(parts) == 2 else None
+        answer = parts[1].split(': ', 1)[1:] if len(parts) == 2 else None
+        if question and answer:
+            pairs.append({"question": question[0], "answer": answer[0]})
+        else:
+            malformed.append(entry)
+    return pairs, malformed
+
+def route_to_json(values, articles):
+    """JSON record of one route from its values by column; `articles` come from map_article_columns."""
+    dep_city = str(values['Lead Departure City'])
+    dest_city = str(values['Lead Destination City'])
+    faq = values.get(FAQ_COLUMN)
+    faq_block, malformed = split_faq(faq) if faq else ([], [])
+    article_blocks = [
+        {"id": block_id,
+         "title": template.replace('{departure_city}', dep_city).replace('{destination_city}', dest_city),
+         "text": format_text(values[column])}
+        for column, block_id, template in articles if values.get(column)
+    ]
+    return {
+        "depCity": values['Lead Departure City code'],
+        "destCity": values['Lead Destination City code'],
+        "imageBlock": dict(IMAGE_BLOCK),
+        "faqBlock": faq_block,
+        "articleBlocks": article_blocks
+    }, malformed
+
+def read_workbook_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    """DataFrames of at most `chunk_rows` rows of the first sheet, read with a read-only workbook.
+
+    Only one chunk is in memory at a time. Header names are stripped; a workbook
+    without data rows yields one empty DataFrame, so its columns are still known.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [f"Unnamed: {index}" if name is None else str(name).strip() for index, name in enumerate(header)]
+        chunk = []
+        yielded = False
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[:len(columns)])
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                yielded = True
+                chunk = []
+        if chunk or not yielded:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+def _chunk_to_json(df, articles, has_faq, verbose):
+    """JSON records of the rows of one chunk and the number of FAQ entries skipped."""
+    dep_cities = df['Lead Departure City']
+    dest_cities = df['Lead Destination City']
+
+    # FAQ section in array format
+    if has_faq:
+        faqs, skipped = faq_blocks(df[FAQ_COLUMN], verbose)
+    else:
+        faqs, skipped = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object), 0
+
+    # Article sections, converted a column at a time
+    blocks = []
+    for column, block_id, template in articles:
+        texts = html_text(df[column])
+        blocks.append((block_id, fill_template(template, dep_cities, dest_cities).tolist(),
+                       texts.where(texts.notna(), None).tolist()))
+
+    json_data = []
+    for position, (dep_city, dest_city, dep_city_code, dest_city_code, faq_block) in enumerate(zip(
+            dep_cities, dest_cities, df['Lead Departure City code'], df['Lead Destination City code'], faqs)):
+        article_blocks = [
+            {"id": block_id, "title": titles[position], "text": texts[position]}
+            for block_id, titles, texts in blocks if texts[position] is not None
+        ]
+        if verbose:
+            print(f"Processed {dep_city} - {dest_city}: "
+                  f"{len(faq_block)} FAQ entries, {len(article_blocks)} article blocks")
+
+        # Append the structured JSON data to the list
+        json_data.append({
+            "depCity": dep_city_code,
+            "destCity": dest_city_code,
+            "imageBlock": dict(IMAGE_BLOCK),
+            "faqBlock": faq_block,
+            "articleBlocks": article_blocks
+        })
+    return json_data, skipped
+
+def iter_workbook_json(chunks, choose_templates, verbose=False):
+    """JSON records of a content workbook, one per route, with FAQ and article blocks.
+
+    `chunks` are DataFrames of consecutive rows. `choose_templates(columns)` returns the
+    section title templates of the workbook; it is called once, with the columns of
+    the first chunk, and the column mapping is reused for the rest of the file.
+    """
+    articles = None
+    skipped = 0
+    for df in chunks:
+        if articles is None:
+            articles, missing = map_article_columns(df.columns, choose_templates(df.columns))
+            for template in missing:
+                print(f"Column not found for key: {template}")
+            if verbose:
+                for _, _, template in articles:
+                    print(f"Found column for key: {template}")
+            has_faq = FAQ_COLUMN in df.columns
+            if not has_faq:
+                print(f"Warning: '{FAQ_COLUMN}' column not found in the Excel file.")
+        records, chunk_skipped = _chunk_to_json(df, articles, has_faq, verbose)
+        skipped += chunk_skipped
+        yield from records
+    if skipped:
+        print(f"Skipped {skipped} FAQ entries with an incorrect format" + ("" if verbose else " (use --verbose to list them)"))
+
+def workbook_to_json(df, templates, verbose=False):
+    """JSON records of a content workbook already loaded as a DataFrame."""
+    return list(iter_workbook_json([df], lambda columns: templates, verbose))
+
+class RecordWriter:
+    """Writes route records one at a time; the JSON array has the same layout as json.dump(..., indent=4)."""
+
+    def __init__(self, file, output_format='json'):
+        self.file = file
+        self.output_format = output_format
+        self.count = 0
+
+    def write(self, record):
+        if self.output_format == 'jsonl':
+            self.file.write(json.dumps(record) + '\n')
+        else:
+            self.file.write(('[\n' if self.count == 0 else ',\n') + '    ' + json.dumps(record, indent=4).replace('\n', '\n    '))
+        self.count += 1
+
+    def close(self):
+        if self.output_format == 'json':
+            self.file.write('[]' if self.count == 0 else '\n]')
+
+def write_records(file, records, output_format='json'):
+    writer = RecordWriter(file, output_format)
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+def write_json_atomic(path, records, output_format='json'):
+    """Stream records to a temporary file and rename it, so a partial file is never left behind."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w') as json_file:
+            write_records(json_file, records, output_format)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class RouteJsonWriter:
+    """Streams the generated rows of a workbook-shaped run straight to a JSON or JSON Lines file.
+
+    Rows are lists in the order of `headers`; each is converted with route_to_json and
+    written at once. The file is written under a temporary name and renamed by close().
+    """
+
+    def __init__(self, path, headers, templates, output_format='json'):
+        self.path = path
+        self.headers = headers
+        self.articles, _ = map_article_columns(headers, templates)
+        self.malformed = 0
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+        self._file = open(self._tmp_path, 'w')
+        self._writer = RecordWriter(self._file, output_format)
+
+    def append(self, row):
+        record, malformed = route_to_json(dict(zip(self.headers, row)), self.articles)
+        self.malformed += len(malformed)
+        self._writer.write(record)
+
+    def close(self):
+        self._writer.close()
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+def route_id(record):
+    """depCity-destCity of a record, made safe for a file name."""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', f"{record['depCity']}-{record['destCity']}")
+
+def _write_bytes_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as route_file:
+        route_file.write(data)
+    os.replace(tmp_path, path)
+
+def diff_route_manifests(previous, current):
+    """Routes added, changed and removed between two route manifests ({route id: {"sha256": ...}})."""
+    return {
+        "added": sorted(route for route in current if route not in previous),
+        "changed": sorted(route for route in current
+                          if route in previous and previous[route]["sha256"] != current[route]["sha256"]),
+        "removed": sorted(route for route in previous if route not in current),
+        "unchanged": sum(1 for route in current
+                         if route in previous and previous[route]["sha256"] == current[route]["sha256"]),
+    }
+
+def write_route_shards(directory, records):
+    """Write one compact JSON file per route, the routes manifest and the changes since the previous manifest.
+
+    Files of unchanged routes are left untouched and files of routes that are no longer
+    in the workbook are removed, so publishing only needs the routes in changes.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, ROUTES_MANIFEST)
+    previous = load_manifest(manifest_path).get('routes', {})
+    routes = {}
+    duplicates = 0
+    for record in records:
+        route = route_id(record)
+        duplicates += route in routes
+        data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        entry = {"file": f"{route}.json", "sha256": hashlib.sha256(data).hexdigest()}
+        path = os.path.join(directory, entry["file"])
+        if previous.get(route) != entry or not os.path.exists(path):
+            _write_bytes_atomic(path, data)
+        routes[route] = entry
+
+    if duplicates:
+        print(f"{duplicates} rows repeat a route of an earlier row; the later row is kept")
+    changes = diff_route_manifests(previous, routes)
+    for route in changes["removed"]:
+        path = os.path.join(directory, previous[route]["file"])
+        if os.path.exists(path):
+            os.remove(path)
+    save_manifest(manifest_path, {"routes": routes})
+    save_manifest(os.path.join(directory, ROUTE_CHANGES), changes)
+    print(f"Routes in {directory}: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+          f"{len(changes['removed'])} removed, {changes['unchanged']} unchanged")
+    return changes
+
+def clear_route_changes(directory):
+    """Record that nothing changed, for a workbook skipped as unchanged."""
+    routes = load_manifest(os.path.join(directory, ROUTES_MANIFEST)).get('routes', {})
+    save_manifest(os.path.join(directory, ROUTE_CHANGES), diff_route_manifests(routes, routes))
+
+def routes_folder_name(filename):
+    """Route folder of a workbook: its name without the generators' date suffix."""
+    return WORKBOOK_DATE_SUFFIX.sub('', os.path.splitext(filename)[0])
+
+def convert_workbook(job):
+    """Convert one workbook and write its JSON file (or route folder); returns an error message or None."""
+    iter_json, file_path, output_path, output_format, verbose = job
+    try:
+        if output_format == 'routes':
+            write_route_shards(output_path, iter_json(file_path, verbose))
+        else:
+            write_json_atomic(output_path, iter_json(file_path, verbose), output_format)
+        return None
+    except Exception as e:
+        return str(e)
+
+def convert_folder(folder_path, output_folder, iter_json, parser_version, workers=None, force=False, verbose=False,
+                   output_format='json'):
+    """Convert the changed .xlsx workbooks of a folder to JSON, JSON Lines or route files, in parallel processes.
+
+    `iter_json(file_path, verbose)` yields the route records of a workbook and must be a
+    module-level function so it can be sent to the worker processes. Workbooks whose
+    content hash, `parser_version` and output format match the manifest are skipped
+    unless `force`. In the routes format only the newest workbook of each route folder
+    (see routes_folder_name) is converted; older ones would overwrite its routes.
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    manifest = {} if force else load_manifest(manifest_path)
+
+    # Workbooks that changed since the last run
+    jobs = []
+    entries = {}
+    skipped = 0
+    filenames = [filename for filename in sorted(os.listdir(folder_path)) if filename.endswith(".xlsx")]
+    # Dates sort as text, so the last workbook of a folder is the newest
+    newest = {routes_folder_name(filename): filename for filename in filenames}
+    for filename in filenames:
+        file_path = os.path.join(folder_path, filename)
+        stem = os.path.splitext(filename)[0]
+        if output_format == 'routes':
+            folder = routes_folder_name(filename)
+            if newest[folder] != filename:
+                print(f"Skipping {filename}: {newest[folder]} is newer and writes the same route folder")
+                continue
+            output_path = os.path.join(output_folder, folder)
+        else:
+            output_path = os.path.join(output_folder, f"{stem}.{output_format}")
+        previous = manifest.get(filename)
+        source_hash, stat = source_digest(file_path, previous)
+        entry = {'source': source_hash, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'parser': parser_version, 'format': output_format}
+        if previous and all(previous.get(field) == entry[field] for field in ('source', 'parser', 'format')) \
+                and os.path.exists(output_path):
+            manifest[filename] = entry
+            skipped += 1
+            if output_format == 'routes':
+                clear_route_changes(output_path)
+            continue
+        print(f"Processing {filename}...")
+        jobs.append((iter_json, file_path, output_path, output_format, verbose))
+        entries[file_path] = (filename, entry)
+
+    # The manifest is saved even when interrupted, so finished workbooks are not converted again
+    try:
+        if len(jobs) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                failed = _record_results(zip(jobs, executor.map(convert_workbook, jobs)), entries, manifest)
+        else:
+            failed = _record_results(((job, convert_workbook(job)) for job in jobs), entries, manifest)
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    print(f"Converted workbooks: {len(jobs) - failed}, failed: {failed}, skipped as unchanged: {skipped}")
+
+def _record_results(results, entries, manifest):
+    failed = 0
+    for job, error in results:
+        filename, entry = entries[job[1]]
+        if error is None:
+            manifest[filename] = entry
+            print(f"Successfully processed and saved JSON for {filename}")
+        else:
+            manifest.pop(filename, None)
+            failed += 1
+            print(f"An error occurred while processing {filename}: {error}")
+    return failed
@@ -0,0 +1,417 @@
+"""Durable SQLite work queue for generating content with several processes or machines.
+
+The routes of a city pairs CSV are split into (route, language, section) tasks stored
+in one SQLite database file. Any number of workers, on this host or on others that
+share the file, claim tasks independently: a claimed task is leased to its worker,
+the lease is extended by a heartbeat while the request runs, and a task whose worker
+died is claimed again once its lease expires. Failed tasks are retried up to
+--max-attempts times. When the queue is drained, `assemble` writes the usual workbook
+and/or JSON files.
+
+    python work_queue.py enqueue --db Promos/queue.sqlite --language english --input departures_destinations.csv
+    python work_queue.py work --db Promos/queue.sqlite --concurrency 8      # on every host
+    python work_queue.py status --db Promos/queue.sqlite
+    python work_queue.py assemble --db Promos/queue.sqlite --language english --output-format xlsx json
+
+Sections that are identical for every route to a destination are stored once and
+shared, as in the generators. The database is opened in WAL mode; on a network share
+make sure the file system supports SQLite locking.
+"""
+import argparse
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from openpyxl import Workbook
+from generation_engine import DEFAULT_MAX_CONCURRENCY, ROUTE_COLUMNS, VariedPrompt, iter_routes, vary_prompts
+from openai_api import configure_cache, set_api_base
+from rate_limiter import RATE_LIMIT_MODES, configure_rate_limiter
+from response_cache import CACHE_MODES, request_key
+from seo_json import ARTICLE_KEYS, RouteJsonWriter
+
+DEFAULT_DB = os.path.join("Promos", "queue.sqlite")
+# Seconds a claimed task stays reserved without a heartbeat
+DEFAULT_LEASE = 120.0
+DEFAULT_MAX_ATTEMPTS = 5
+# Generator module and file prefix of each language
+LANGUAGES = {
+    "english": ("SEO_Content_generator", "Content_table"),
+    "spanish": ("Spanish_SEO_Content_generator", "Spanish_Content_table"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    prompt_key TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    variation TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated REAL,
+    UNIQUE (language, prompt_key)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS routes (
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    route TEXT NOT NULL,
+    PRIMARY KEY (language, position)
+);
+CREATE TABLE IF NOT EXISTS route_sections (
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    section INTEGER NOT NULL,
+    task_id INTEGER NOT NULL REFERENCES tasks (id),
+    PRIMARY KEY (language, position, section)
+);
+"""
+
+def connect(db_path):
+    """Connection to the queue database; waits for locks held by other workers instead of failing."""
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+def generator_module(language):
+    return importlib.import_module(LANGUAGES[language][0])
+
+def enqueue(db_path, language, city_pairs, vary_per_route=False):
+    """Add a task for every section of every route; tasks already in the queue are kept as they are."""
+    generator = generator_module(language)
+    build_prompts = generator.build_prompts
+    if vary_per_route:
+        build_prompts = vary_prompts(build_prompts, generator.SHARED_SECTIONS)
+    connection = connect(db_path)
+    now = time.time()
+    added = 0
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM route_sections WHERE language = ?", (language,))
+        connection.execute("DELETE FROM routes WHERE language = ?", (language,))
+        for position, route in enumerate(iter_routes(city_pairs)):
+            connection.execute("INSERT INTO routes (language, position, route) VALUES (?, ?, ?)",
+                               (language, position, json.dumps(list(route))))
+            for section, prompt in enumerate(build_prompts(route[1], route[4])):
+                variation = getattr(prompt, "variation", None)
+                # The request key covers the prompt and the seed, so shared sections map to one task
+                prompt_key = request_key(generator.build_request(prompt))
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO tasks (language, prompt_key, prompt, variation, updated) "
+                    "VALUES (?, ?, ?, ?, ?)", (language, prompt_key, str(prompt), variation, now))
+                added += cursor.rowcount
+                task_id = connection.execute("SELECT id FROM tasks WHERE language = ? AND prompt_key = ?",
+                                             (language, prompt_key)).fetchone()[0]
+                connection.execute(
+                    "INSERT INTO route_sections (language, position, section, task_id) VALUES (?, ?, ?, ?)",
+                    (language, position, section, task_id))
+    routes = connection.execute("SELECT COUNT(*) FROM routes WHERE language = ?", (language,)).fetchone()[0]
+    connection.close()
+    print(f"Queued {routes} {language} routes in {db_path}: {added} new tasks")
+    return added
+
+class Worker:
+    """Claims tasks from the queue and answers them, keeping its leases alive with a heartbeat."""
+
+    def __init__(self, db_path, worker_id=None, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 languages=None):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.languages = list(languages or LANGUAGES)
+        self.done = 0
+        self.failed = 0
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Set when the heartbeat could not extend the leases; the tasks in progress may belong to another worker
+        self._lease_lost = threading.Event()
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = connect(self.db_path)
+        return self._local.connection
+
+    def claim(self):
+        """Lease the next pending task, or one whose lease expired; None when there is nothing to claim."""
+        connection = self._connection()
+        now = time.time()
+        placeholders = ", ".join("?" for _ in self.languages)
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            # Tasks whose last worker died on the final attempt are given up
+            connection.execute(
+                "UPDATE tasks SET status = 'failed', error = 'lease expired', lease_owner = NULL, updated = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            row = connection.execute(
+                f"SELECT id, language, prompt, variation FROM tasks WHERE language IN ({placeholders}) "
+                "AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY id LIMIT 1", (*self.languages, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                (self.worker_id, now + self.lease, now, row[0]))
+        with self._lock:
+            self._held.add(row[0])
+        return row
+
+    def finish(self, task_id, result=None, error=None):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            if error is None:
+                # A late answer is still a valid answer, even if the lease was taken over meanwhile
+                connection.execute(
+                    "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_owner = NULL, updated = ? "
+                    "WHERE id = ? AND status != 'done'", (result, now, task_id))
+            else:
+                connection.execute(
+                    "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "error = ?, lease_owner = NULL, updated = ? WHERE id = ? AND lease_owner = ?",
+                    (self.max_attempts, error[:500], now, task_id, self.worker_id))
+        with self._lock:
+            self._held.discard(task_id)
+            if error is None:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def heartbeat(self):
+        """Extend the leases of the tasks in progress every third of the lease time.
+
+        If the leases cannot be extended the worker stops: its tasks in progress are given
+        up rather than finished, as another worker may claim them once the leases expire.
+        """
+        try:
+            connection = connect(self.db_path)
+            try:
+                while not self._stopped.wait(self.lease / 3):
+                    with self._lock:
+                        held = list(self._held)
+                    if held:
+                        connection.execute(
+                            f"UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = 'leased' "
+                            f"AND id IN ({', '.join('?' for _ in held)})",
+                            (time.time() + self.lease, self.worker_id, *held))
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"Worker {self.worker_id}: heartbeat failed, giving up the tasks in progress and stopping: {e}")
+            self._lease_lost.set()
+            self._stopped.set()
+
+    def run_one(self):
+        """Claim and answer one task; False when the queue has nothing left to claim."""
+        task = self.claim()
+        if task is None:
+            return False
+        task_id, language, prompt, variation = task
+        if variation is not None:
+            prompt = VariedPrompt(prompt, variation)
+        try:
+            answer = generator_module(language).call_openai_api(prompt)
+        except Exception as e:
+            if self._give_up(task_id):
+                return False
+            print(f"Task {task_id} failed: {e}")
+            self.finish(task_id, error=str(e))
+        else:
+            if self._give_up(task_id):
+                return False
+            self.finish(task_id, result=answer)
+        return True
+
+    def _give_up(self, task_id):
+        """Drop a task whose lease may have been lost; True when it was dropped."""
+        if not self._lease_lost.is_set():
+            return False
+        with self._lock:
+            self._held.discard(task_id)
+        print(f"Task {task_id} given up: its lease could not be extended")
+        return True
+
+    def run(self, concurrency=DEFAULT_MAX_CONCURRENCY, wait=False, poll_interval=5.0):
+        """Work until the queue is drained; with `wait`, keep polling for new or expired tasks.
+
+        Returns False when the worker stopped because its heartbeat failed.
+        """
+        heartbeat = threading.Thread(target=self.heartbeat, daemon=True)
+        heartbeat.start()
+
+        def work():
+            while not self._stopped.is_set():
+                if not self.run_one():
+                    if not wait:
+                        return
+                    time.sleep(poll_interval)
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for future in [executor.submit(work) for _ in range(concurrency)]:
+                    future.result()
+        finally:
+            self._stopped.set()
+            heartbeat.join()
+        print(f"Worker {self.worker_id}: {self.done} tasks done, {self.failed} failed attempts")
+        return not self._lease_lost.is_set()
+
+def queue_status(db_path):
+    """Task counts per language and status."""
+    connection = connect(db_path)
+    counts = {}
+    for language, status, count in connection.execute(
+            "SELECT language, status, COUNT(*) FROM tasks GROUP BY language, status"):
+        counts.setdefault(language, {})[status] = count
+    connection.close()
+    return counts
+
+def retry_failed(db_path, language=None):
+    """Put failed tasks back in the queue with a fresh attempt count."""
+    connection = connect(db_path)
+    with connection:
+        cursor = connection.execute(
+            "UPDATE tasks SET status = 'pending', attempts = 0, updated = ? WHERE status = 'failed' "
+            "AND (? IS NULL OR language = ?)", (time.time(), language, language))
+    connection.close()
+    return cursor.rowcount
+
+def iter_assembled_rows(connection, language):
+    """(route, row) of every queued route in CSV order; row is None while a section is not done."""
+    routes = connection.execute("SELECT position, route FROM routes WHERE language = ? ORDER BY position",
+                                (language,))
+    for position, route in routes.fetchall():
+        sections = connection.execute(
+            "SELECT tasks.status, tasks.result FROM route_sections JOIN tasks ON tasks.id = route_sections.task_id "
+            "WHERE route_sections.language = ? AND route_sections.position = ? ORDER BY route_sections.section",
+            (language, position)).fetchall()
+        route = json.loads(route)
+        if all(status == "done" for status, _ in sections):
+            yield route, route + [result for _, result in sections]
+        else:
+            yield route, None
+
+def assemble(db_path, language, output_formats=("xlsx",), file_prefix=None):
+    """Write the finished routes of a language to a timestamped workbook and/or JSON files in Promos/."""
+    generator = generator_module(language)
+    headers = generator.HEADERS
+    directory = "Promos"
+    os.makedirs(directory, exist_ok=True)
+    base = f"{directory}/{file_prefix or LANGUAGES[language][1]}_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    outputs = []
+    if "xlsx" in output_formats:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Promotions")
+        ws.append(headers)
+        outputs.append(ws)
+    json_writers = [RouteJsonWriter(f"{base}.{output_format}", headers, ARTICLE_KEYS[language], output_format)
+                    for output_format in ("json", "jsonl") if output_format in output_formats]
+    outputs.extend(json_writers)
+
+    connection = connect(db_path)
+    written = missing = 0
+    try:
+        for route, row in iter_assembled_rows(connection, language):
+            if row is None:
+                missing += 1
+                continue
+            for output in outputs:
+                output.append(row)
+            written += 1
+    except BaseException:
+        for writer in json_writers:
+            writer.discard()
+        raise
+    finally:
+        connection.close()
+
+    if "xlsx" in output_formats:
+        wb.save(f"{base}.xlsx")
+        print("Excel file saved as:", f"{base}.xlsx")
+    for writer in json_writers:
+        writer.close()
+        print("JSON file saved as:", writer.path)
+    print(f"Assembled {written} routes" + (f"; {missing} routes are not finished yet and were left out" if missing else ""))
+    return written, missing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite work queue for the content generators.")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Queue database file (default: {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Queue the sections of every route of a city pairs CSV")
+    enqueue_parser.add_argument("--language", choices=list(LANGUAGES), default="english")
+    enqueue_parser.add_argument("--input", default=None, metavar="CSV",
+                                help="City pairs CSV (default: departures_destinations.csv next to the script)")
+    enqueue_parser.add_argument("--vary-per-route", action="store_true",
+                                help="Generate destination-only sections separately for every route")
+
+    work_parser = commands.add_parser("work", help="Claim and answer tasks until the queue is drained")
+    work_parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                             help=f"Tasks in flight at once in this worker (default: {DEFAULT_MAX_CONCURRENCY})")
+    work_parser.add_argument("--language", choices=list(LANGUAGES), nargs="+", default=None,
+                             help="Only claim tasks of these languages (default: all)")
+    work_parser.add_argument("--worker-id", default=None, help="Name of this worker (default: host-pid-random)")
+    work_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                             help=f"Seconds a task stays reserved without a heartbeat (default: {DEFAULT_LEASE:g})")
+    work_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                             help=f"Attempts before a task is marked failed (default: {DEFAULT_MAX_ATTEMPTS})")
+    work_parser.add_argument("--wait", action="store_true",
+                             help="Keep polling for new or expired tasks instead of exiting when the queue is empty")
+    work_parser.add_argument("--cache", choices=CACHE_MODES, default="use", help="Response cache mode")
+    work_parser.add_argument("--rate-limit", choices=RATE_LIMIT_MODES, default="auto",
+                             help="Pace requests to the API's rate limits ('auto') or not ('off')")
+    work_parser.add_argument("--api-base", default=None, help="Base URL of the OpenAI-compatible API")
+
+    commands.add_parser("status", help="Show the task counts per language and status")
+
+    retry_parser = commands.add_parser("retry-failed", help="Queue the failed tasks again")
+    retry_parser.add_argument("--language", choices=list(LANGUAGES), default=None)
+
+    assemble_parser = commands.add_parser("assemble", help="Write the finished routes to a workbook and/or JSON")
+    assemble_parser.add_argument("--language", choices=list(LANGUAGES), default="english")
+    assemble_parser.add_argument("--output-format", nargs="+", choices=("xlsx", "json", "jsonl"), default=["xlsx"],
+                                 metavar="FORMAT", help="xlsx, json and/or jsonl (default: xlsx)")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    if args.command == "enqueue":
+        script_directory = os.path.dirname(os.path.abspath(__file__))
+        generator = generator_module(args.language)
+        city_pairs = generator.read_city_pairs(args.input or os.path.join(script_directory, 'departures_destinations.csv'))
+        if city_pairs.empty:
+            print("No city pairs found or unable to read the file. Please check your CSV file.")
+        else:
+            enqueue(args.db, args.language, city_pairs[ROUTE_COLUMNS], vary_per_route=args.vary_per_route)
+    elif args.command == "work":
+        configure_cache(args.cache)
+        configure_rate_limiter(args.rate_limit)
+        if args.api_base:
+            set_api_base(args.api_base)
+        worker = Worker(args.db, worker_id=args.worker_id, lease=args.lease, max_attempts=args.max_attempts,
+                        languages=args.language)
+        if not worker.run(args.concurrency, wait=args.wait):
+            raise SystemExit(1)
+    elif args.command == "status":
+        for language, counts in sorted(queue_status(args.db).items()):
+            print(f"{language}: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    elif args.command == "retry-failed":
+        print(f"Queued {retry_failed(args.db, args.language)} failed tasks again")
+    elif args.command == "assemble":
+        assemble(args.db, args.language, args.output_format)